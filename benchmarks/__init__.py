@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+"""Benchmarks for the hbnb storage engines.
+
+Run them from the repository root, e.g.:
+    python3 -m benchmarks.file_codecs
+"""
+import importlib.util
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+
+def sample_objects(scale=1000, seed=0):
+    """Builds a realistic set of hbnb objects, without saving them.
+
+    For a scale of n there are n / 20 states, n / 4 cities, n / 4 users,
+    n / 2 places, n reviews and 30 amenities.
+
+    Keyword Arguments:
+        scale -- Number of reviews, the largest class (default: {1000})
+        seed -- Seed of the random generator (default: {0})
+
+    Returns:
+        List of model instances, parents before children.
+    """
+    from models.amenity import Amenity
+    from models.city import City
+    from models.place import Place
+    from models.review import Review
+    from models.state import State
+    from models.user import User
+
+    rand = random.Random(seed)
+    start = datetime(2020, 1, 1)
+
+    def stamp():
+        return start + timedelta(seconds=rand.randrange(10 ** 8),
+                                 microseconds=rand.randrange(1, 10 ** 6))
+
+    def dated(obj):
+        obj.created_at = stamp()
+        obj.updated_at = obj.created_at + timedelta(days=rand.randrange(30))
+        return obj
+
+    states = [dated(State(name='State {}'.format(i)))
+              for i in range(max(1, scale // 20))]
+    cities = [dated(City(name='City {}'.format(i),
+                         state_id=rand.choice(states).id))
+              for i in range(max(1, scale // 4))]
+    users = [dated(User(email='user{}@hbnb.io'.format(i), password='pwd',
+                        first_name='First{}'.format(i),
+                        last_name='Last{}'.format(i)))
+             for i in range(max(1, scale // 4))]
+    amenities = [dated(Amenity(name='Amenity {}'.format(i)))
+                 for i in range(30)]
+    places = [dated(Place(name='Place {}'.format(i),
+                          city_id=rand.choice(cities).id,
+                          user_id=rand.choice(users).id,
+                          description='A nice place ' * rand.randrange(1, 8),
+                          number_rooms=rand.randrange(1, 6),
+                          number_bathrooms=rand.randrange(1, 3),
+                          max_guest=rand.randrange(1, 10),
+                          price_by_night=rand.randrange(20, 300),
+                          latitude=rand.uniform(-90, 90),
+                          longitude=rand.uniform(-180, 180)))
+              for i in range(max(1, scale // 2))]
+    reviews = [dated(Review(place_id=rand.choice(places).id,
+                            user_id=rand.choice(users).id,
+                            text='Great stay ' * rand.randrange(1, 20)))
+               for i in range(scale)]
+    return states + cities + users + amenities + places + reviews
+
+
+def timed(func, *args, repeat=3, **kwargs):
+    """Returns the best wall clock time of repeat calls, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def client(name):
+    """Returns a Flask test client of the web_flask application name
+
+    The application reads models.storage on each request, so it can be
+    replaced once the client is built.
+    """
+    root = os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'web_flask')
+    spec = importlib.util.spec_from_file_location(
+        name.replace('-', '_'), os.path.join(root, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.app.root_path = root
+    return module.app.test_client()
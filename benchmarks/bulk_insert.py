@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+"""Compares one-by-one and bulk ingestion rates of the storage engines.
+
+one is storage.new() plus storage.save() per object, bulk is
+storage.new_many() plus a single storage.bulk_save(). The one-by-one
+rate is measured on the first objects only, it does not get faster
+with more objects.
+
+Usage: python3 -m benchmarks.bulk_insert [scale ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from benchmarks import sample_objects
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+
+
+def one_by_one(storage, objects):
+    """Saves objects one at a time, returns the rate in objects/s"""
+    start = time.perf_counter()
+    for obj in objects:
+        storage.new(obj)
+        storage.save()
+    return len(objects) / (time.perf_counter() - start)
+
+
+def bulk(storage, objects):
+    """Saves objects in bulk, returns the rate in objects/s"""
+    start = time.perf_counter()
+    storage.new_many(objects)
+    storage.bulk_save()
+    return len(objects) / (time.perf_counter() - start)
+
+
+def run(scale):
+    """Prints the ingestion rates of each engine for scale"""
+    tmp = tempfile.mkdtemp()
+    try:
+        engines = (
+            ('file', lambda name: FileStorage(os.path.join(tmp, name))),
+            ('sqlite', lambda name: SQLiteStorage(os.path.join(tmp, name))),
+        )
+        for engine, storage in engines:
+            objects = sample_objects(scale)
+            one = one_by_one(storage(engine + '.one'), objects[:500])
+            objects = sample_objects(scale, seed=1)
+            many = bulk(storage(engine + '.bulk'), objects)
+            print('{:>8} objects  {:<6}  one {:>9.0f}/s  '
+                  'bulk {:>9.0f}/s'.format(len(objects), engine, one, many))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    for scale in sys.argv[1:] or ['10000', '100000']:
+        run(int(scale))
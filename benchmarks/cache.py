@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+"""Times the web_flask pages with and without CachedStorage.
+
+Each page is served 20 times through the Flask test client, on the
+same SQLite database, first by the bare storage, then by the storage
+wrapped in a CachedStorage. Every page reads through query(), so all
+of them are cached.
+
+Usage: python3 -m benchmarks.cache [scale ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from benchmarks import client, sample_objects, timed
+
+PAGES = (
+    ('7-states_list', '/states_list'),
+    ('8-cities_by_states', '/cities_by_states'),
+    ('10-hbnb_filters', '/hbnb_filters'),
+    ('100-hbnb', '/hbnb'),
+)
+REQUESTS = 20
+
+
+def serve(app, url):
+    """Serves url REQUESTS times"""
+    for _ in range(REQUESTS):
+        assert app.get(url).status_code == 200
+
+
+def run(scale):
+    """Prints the time of each page without and with the cache"""
+    import models
+    from models.engine.cached_storage import CachedStorage
+    from models.engine.sqlite_storage import SQLiteStorage
+
+    tmp = tempfile.mkdtemp()
+    try:
+        storage = SQLiteStorage(os.path.join(tmp, 'hbnb.db'))
+        storage.new_many(sample_objects(scale))
+        storage.bulk_save()
+        cached = CachedStorage(storage)
+        print('{} reviews, {} requests per page:'.format(scale, REQUESTS))
+        for name, url in PAGES:
+            app = client(name)
+            models.storage = storage
+            old = timed(serve, app, url)
+            models.storage = cached
+            new = timed(serve, app, url)
+            print('  {:<18} storage {:7.3f}s  cached {:7.3f}s  '
+                  'x{:.2f}'.format(url, old, new, old / new))
+        print('  {hits} hits, {misses} misses, {size} entries'.format(
+            **cached.stats()))
+        storage.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    os.environ['HBNB_TYPE_STORAGE'] = 'sqlite'
+    os.environ.setdefault('HBNB_SQLITE_PATH', os.path.join(
+        tempfile.gettempdir(), 'hbnb_benchmark.db'))
+    for scale in sys.argv[1:] or ['2000', '20000']:
+        run(int(scale))
@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+"""Times DBStorage.all() against the previous per-row to_dict() keys.
+
+before is the former implementation, rebuilt here: one query per class
+and a key made from instance.to_dict()['__class__']. Both run on a
+fresh session, so the rows are really loaded each time.
+
+Usage: python3 -m benchmarks.db_all [scale ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from benchmarks import sample_objects, timed
+from models.amenity import Amenity
+from models.city import City
+from models.engine.sqlite_storage import SQLiteStorage
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+
+
+def before(storage):
+    """The former DBStorage.all(), keyed through to_dict()"""
+    session = storage._DBStorage__session
+    all_objects = {}
+    for _cls in [User, Place, State, City, Amenity, Review]:
+        for instance in session.query(_cls).all():
+            all_objects.update({'.'.join([
+                instance.to_dict()['__class__'], instance.id]): instance})
+    return all_objects
+
+
+def fresh(storage, func):
+    """Runs func(storage) on a new session"""
+    storage.close()
+    storage.reload()
+    return func(storage)
+
+
+def run(scale):
+    """Prints the time of all() before and after for scale"""
+    tmp = tempfile.mkdtemp()
+    try:
+        storage = SQLiteStorage(os.path.join(tmp, 'hbnb.db'))
+        storage.new_many(sample_objects(scale))
+        storage.bulk_save()
+        rows = storage.count()
+        old = timed(fresh, storage, before)
+        new = timed(fresh, storage, lambda storage: storage.all())
+        print('{:>8} rows  before {:6.3f}s  after {:6.3f}s  '
+              'x{:.2f}'.format(rows, old, new, old / new))
+        storage.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    for scale in sys.argv[1:] or ['50000']:
+        run(int(scale))
@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+"""Compares the size and speed of the FileStorage codecs.
+
+decode is the codec alone, open is reload() (lazy, nothing hydrated)
+and hydrate is reload() followed by building every model instance.
+The binary codecs trade speed for size: their decoder is pure Python
+and slower than the C JSON parser, only mapped opens faster, since it
+decodes nothing up front.
+
+Usage: python3 -m benchmarks.file_codecs [scale ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from benchmarks import sample_objects, timed
+from models.engine.codecs import get_codec
+from models.engine.file_storage import FileStorage
+
+
+def decode(path, codec):
+    """Reads and decodes the records of path"""
+    with open(path, 'rb' if codec.binary else 'r') as f:
+        return codec.loads(f.read())
+
+
+def hydrate(path, codec):
+    """Reloads path and builds every model instance"""
+    store = FileStorage(path, codec=codec)
+    store.reload()
+    return store.all()
+
+
+def run(scale):
+    """Prints file size, save and reload time of each codec for scale"""
+    objects = sample_objects(scale)
+    tmp = tempfile.mkdtemp()
+    try:
+        for codec in ('json', 'binary', 'mapped'):
+            path = os.path.join(tmp, 'file.' + codec)
+            store = FileStorage(path, codec=codec)
+            for obj in objects:
+                store.new(obj)
+            save = timed(store.save)
+            decoded = timed(decode, path, get_codec(codec))
+            opened = timed(
+                lambda: FileStorage(path, codec=codec).reload())
+            hydrated = timed(lambda: hydrate(path, codec))
+            print('{:>8} objects  {:<6}  {:>7.2f} MiB  save {:6.3f}s  '
+                  'decode {:6.3f}s  open {:6.3f}s  hydrate {:6.3f}s'.format(
+                      len(objects), codec, os.path.getsize(path) / 2 ** 20,
+                      save, decoded, opened, hydrated))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    for scale in sys.argv[1:] or ['10000', '100000']:
+        run(int(scale))
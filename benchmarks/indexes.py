@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+"""Times the web_flask pages before and after storage.migrate().
+
+The database is filled, its model indexes are dropped to stand for a
+database created before they were declared, then each page is served
+through the Flask test client. /states/<id> is timed over 100 states.
+
+Usage: python3 -m benchmarks.indexes [scale ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from benchmarks import client, sample_objects
+
+PAGES = (
+    ('7-states_list', '/states_list'),
+    ('8-cities_by_states', '/cities_by_states'),
+    ('9-states', '/states'),
+    ('9-states', '/states/{}'),
+    ('10-hbnb_filters', '/hbnb_filters'),
+    ('100-hbnb', '/hbnb'),
+)
+
+
+def serve(pages, ids):
+    """Returns the best of 3 times of each page, in seconds"""
+    times = []
+    for app, url in pages:
+        urls = [url.format(id) for id in ids] if '{}' in url else [url]
+        best = None
+        for _ in range(3):
+            start = time.perf_counter()
+            for path in urls:
+                assert app.get(path).status_code == 200
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        times.append(best)
+    return times
+
+
+def run(scale):
+    """Prints the time of each page before and after the migration"""
+    import models
+    from models.base_model import Base
+    from models.engine.sqlite_storage import SQLiteStorage
+
+    tmp = tempfile.mkdtemp()
+    try:
+        storage = models.storage = SQLiteStorage(
+            os.path.join(tmp, 'hbnb.db'))
+        storage.new_many(sample_objects(scale))
+        storage.bulk_save()
+        ids = sorted(storage.all(models.State))[:100]
+        ids = [key.split('.')[1] for key in ids]
+        engine = storage._DBStorage__engine
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.drop(conn)
+        pages = [(client(name), url) for name, url in PAGES]
+        before = serve(pages, ids)
+        start = time.perf_counter()
+        created = storage.migrate()
+        migrate = time.perf_counter() - start
+        after = serve(pages, ids)
+        print('{} reviews: {} indexes created in {:.3f}s'.format(
+            scale, len(created), migrate))
+        for (name, url), old, new in zip(PAGES, before, after):
+            print('  {:<20} before {:7.3f}s  after {:7.3f}s  x{:.2f}'.format(
+                url.format('<id>'), old, new, old / new))
+        storage.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    os.environ['HBNB_TYPE_STORAGE'] = 'sqlite'
+    os.environ.setdefault('HBNB_SQLITE_PATH', os.path.join(
+        tempfile.gettempdir(), 'hbnb_benchmark.db'))
+    for scale in sys.argv[1:] or ['20000', '100000']:
+        run(int(scale))
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""Compares the peak memory of all() and iter() over a large class.
+
+Each pass walks every Place and keeps only a running total, like an
+export would.
+
+Usage: python3 -m benchmarks.iteration [scale ...]
+"""
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from benchmarks import sample_objects
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.place import Place
+
+
+def peak(walk):
+    """Returns the peak memory allocated by walk(), in MiB"""
+    gc.collect()
+    tracemalloc.start()
+    walk()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def run(scale):
+    """Prints the peak memory of all() and iter() for scale"""
+    tmp = tempfile.mkdtemp()
+    try:
+        engines = (
+            ('sqlite', lambda: SQLiteStorage(os.path.join(tmp, 'hbnb.db'))),
+            ('mapped', lambda: FileStorage(
+                os.path.join(tmp, 'file.hbnbm'), codec='mapped')),
+        )
+        objects = sample_objects(scale)
+        for engine, storage in engines:
+            store = storage()
+            store.new_many(objects)
+            store.bulk_save()
+            store.close()
+            results = []
+            for method in ('all', 'iter'):
+                store = storage()
+                store.reload()
+                results.append(peak(lambda: sum(
+                    place.price_by_night for place in (
+                        store.all(Place).values() if method == 'all'
+                        else store.iter(Place)))))
+            print('{:>8} places  {:<6}  all {:8.1f} MiB  '
+                  'iter {:8.1f} MiB'.format(
+                      scale // 2, engine, *results))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    for scale in sys.argv[1:] or ['20000', '200000']:
+        run(int(scale))
@@ -10,14 +10,22 @@ from models.review import Review
 
 import os
 HBNB_TYPE_STORAGE = os.getenv('HBNB_TYPE_STORAGE')
+HBNB_STORAGE_CACHE = os.getenv('HBNB_STORAGE_CACHE')
 
 if HBNB_TYPE_STORAGE == 'db':
     from models.engine.db_storage import DBStorage
     storage = DBStorage()
+elif HBNB_TYPE_STORAGE == 'sqlite':
+    from models.engine.sqlite_storage import SQLiteStorage
+    storage = SQLiteStorage()
 else:
     from models.engine.file_storage import FileStorage
     storage = FileStorage()
 
+if HBNB_STORAGE_CACHE:
+    from models.engine.cached_storage import CachedStorage
+    storage = CachedStorage(storage)
+
 storage.reload()
 
 __all__ = [
@@ -11,7 +11,7 @@ class Amenity(BaseModel, Base):
     its corresbonding place
     """
     __tablename__ = 'amenities'
-    name = Column(String(128), nullable=False)
+    name = Column(String(128), nullable=False, index=True)
     place_amenities = relationship(
         'Place',
         secondary=place_amenity,
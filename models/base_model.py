@@ -11,6 +11,10 @@ Base = declarative_base()
 
 class BaseModel:
     """A base class for all hbnb models"""
+    # the modified attribute names, and the set of modified objects of
+    # the storage holding the instance, live in slots, out of __dict__
+    __slots__ = ('__dict__', '__weakref__', '__changed', '__dirty')
+
     id = Column(String(60), nullable=False,
                 primary_key=True, default=str(uuid.uuid4),
                 unique=True)
@@ -24,31 +28,59 @@ class BaseModel:
     def __init__(self, *args, **kwargs):
         """Instatntiates a new model"""
 
-        self.id = str(uuid.uuid4())
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
-
         if kwargs:
-            try:
-                kwargs['updated_at'] = datetime.strptime(
-                    kwargs['updated_at'], '%Y-%m-%dT%H:%M:%S.%f'
-                    )
-            except KeyError:
-                pass
-
-            try:
-                kwargs['created_at'] = datetime.strptime(
-                    kwargs['created_at'], '%Y-%m-%dT%H:%M:%S.%f'
-                    )
-            except KeyError:
-                pass
+            for name in ('updated_at', 'created_at'):
+                # binary stores hand datetimes over as they are
+                if isinstance(kwargs.get(name), str):
+                    kwargs[name] = datetime.fromisoformat(kwargs[name])
 
             try:
                 del kwargs['__class__']
             except KeyError:
                 pass
 
-            self.__dict__.update(kwargs)
+        # only make up the attributes the stored record does not provide
+        if 'id' not in kwargs:
+            self.id = str(uuid.uuid4())
+        if 'created_at' not in kwargs:
+            self.created_at = datetime.utcnow()
+        if 'updated_at' not in kwargs:
+            self.updated_at = datetime.utcnow()
+
+        self.__dict__.update(kwargs)
+
+    def __setattr__(self, name, value):
+        """Sets an attribute and remembers it was modified"""
+        super().__setattr__(name, value)
+        if name.startswith('_'):
+            return
+        try:
+            self.__changed.add(name)
+        except AttributeError:
+            object.__setattr__(self, '_BaseModel__changed', {name})
+        dirty = getattr(self, '_BaseModel__dirty', None)
+        if dirty is not None:
+            dirty.add(self)
+
+    def track_changes(self, dirty):
+        """Adds the instance to dirty, a set owned by the storage holding
+        it, whenever one of its attributes is modified
+        """
+        object.__setattr__(self, '_BaseModel__dirty', dirty)
+
+    def changes(self):
+        """Returns the names of the attributes modified since the last
+        clear_changes() call, or since the instance was built from a
+        stored record
+        """
+        try:
+            return frozenset(self.__changed)
+        except AttributeError:
+            return frozenset()
+
+    def clear_changes(self):
+        """Marks the instance as matching its stored record"""
+        object.__setattr__(self, '_BaseModel__changed', set())
 
     def __str__(self):
         """Returns a string representation of the instance"""
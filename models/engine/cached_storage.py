@@ -0,0 +1,283 @@
+#!/usr/bin/python3
+"""This module defines a read cache wrapping a storage engine"""
+from collections import OrderedDict
+from sqlalchemy import inspect
+from models.base_model import Base
+import os
+import threading
+import time
+
+HBNB_CACHE_SIZE = int(os.getenv('HBNB_CACHE_SIZE', 256))
+HBNB_CACHE_TTL = os.getenv('HBNB_CACHE_TTL')
+
+
+def _freeze(value):
+    """Returns a hashable version of a read argument"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _related(cls, load):
+    """Returns the classes reached by the relationship paths of load
+
+    Names that are not relationships, such as State.cities with
+    FileStorage, end their path.
+    """
+    classes = set()
+    for path in load or ():
+        owner = cls
+        for name in path.split('.'):
+            mapper = inspect(owner, raiseerr=False)
+            relationship = mapper and mapper.relationships.get(name)
+            if relationship is None:
+                break
+            owner = relationship.mapper.class_
+            classes.add(owner)
+    return classes
+
+
+def _cascade(cls):
+    """Returns the classes whose rows deleting rows of cls can remove or
+    change: cls, the classes referencing it through a foreign key, and
+    so on, plus the classes linked to them by association tables
+    """
+    if getattr(cls, '__table__', None) is None:
+        return {cls}
+    tables = {cls.__table__}
+    grown = True
+    while grown:
+        grown = False
+        for table in Base.metadata.sorted_tables:
+            if table not in tables and any(
+                    fk.column.table in tables for fk in table.foreign_keys):
+                tables.add(table)
+                grown = True
+    mapped = {mapper.local_table: mapper.class_
+              for mapper in Base.registry.mappers}
+    classes = set()
+    for table in tables:
+        if table in mapped:
+            classes.add(mapped[table])
+        else:
+            classes.update(mapped[fk.column.table]
+                           for fk in table.foreign_keys)
+    return classes
+
+
+class CachedStorage:
+    """This class caches the reads of a storage engine
+
+    all(), get(), count() and query() results are kept in a bounded LRU
+    cache, optionally for ttl seconds only. Each entry remembers the
+    generation of the classes it was read from; new(), new_many(),
+    delete() and delete_where() bump the generation of the classes they
+    touch, and save() the ones of the objects it writes, including the
+    objects modified in place, so an entry is never served after a write
+    to one of its classes in this process. Writes made by other processes
+    are only seen once the entries expire, or, with FileStorage, when
+    close() finds the files changed.
+
+    Cached objects are shared by every caller. With DBStorage they are
+    detached from their session by close(), so relationships read from
+    them have to be loaded up front with load.
+
+    Other methods, such as iter(), go to the wrapped storage uncached.
+    """
+    # generation key of the reads covering every class
+    __every = None
+
+    def __init__(self, storage, size=None, ttl=None):
+        """Wraps storage
+
+        Arguments:
+            storage -- FileStorage or DBStorage instance.
+
+        Keyword Arguments:
+            size -- Maximum number of entries. Defaults to the
+                HBNB_CACHE_SIZE environment variable, then to 256.
+                (default: {None})
+            ttl -- Seconds an entry is served for. Defaults to the
+                HBNB_CACHE_TTL environment variable, then to no limit.
+                (default: {None})
+        """
+        self.__storage = storage
+        self.__size = size or HBNB_CACHE_SIZE
+        if ttl is None and HBNB_CACHE_TTL:
+            ttl = float(HBNB_CACHE_TTL)
+        self.__ttl = ttl
+        self.__entries = OrderedDict()
+        self.__generations = {}
+        # bumped by clear(), so reads running meanwhile are not kept
+        self.__epoch = 0
+        # classes written since the last save()
+        self.__pending = set()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        """Delegates the other methods to the wrapped storage"""
+        if name.startswith('_CachedStorage__'):
+            raise AttributeError(name)
+        return getattr(self.__storage, name)
+
+    def stats(self):
+        """Returns the hits, misses and size of the cache"""
+        with self.__lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self.__entries)}
+
+    def clear(self):
+        """Drops every entry"""
+        with self.__lock:
+            self.__entries.clear()
+            self.__epoch += 1
+
+    def all(self, cls=None, **kwargs):
+        """Returns storage.all(cls, ...), from the cache when possible"""
+        if cls is None:
+            classes = ()
+        elif isinstance(cls, (list, tuple, set)):
+            classes = set(cls)
+        else:
+            classes = {cls}
+        for _cls in list(classes):
+            classes |= _related(_cls, kwargs.get('load'))
+        return dict(self.__read('all', classes, cls, **kwargs))
+
+    def get(self, cls, id, load=None):
+        """Returns storage.get(cls, id), from the cache when possible"""
+        return self.__read('get', {cls} | _related(cls, load), cls, id,
+                           load=load)
+
+    def count(self, cls=None):
+        """Returns storage.count(cls), from the cache when possible"""
+        return self.__read('count', () if cls is None else {cls}, cls)
+
+    def query(self, cls, *args, **kwargs):
+        """Returns storage.query(cls, ...), from the cache when possible"""
+        classes = {cls} | _related(cls, kwargs.get('load'))
+        return dict(self.__read('query', classes, cls, *args, **kwargs))
+
+    def __read(self, method, classes, *args, **kwargs):
+        """Returns the cached result of a read, running it on a miss
+
+        Arguments:
+            method -- Name of the storage method.
+            classes -- Classes the result is read from, every class when
+                empty.
+        """
+        deps = tuple(sorted(classes, key=lambda c: c.__name__)) or (
+            self.__every,)
+        key = (method, _freeze(args), _freeze(kwargs))
+        with self.__lock:
+            generations = self.__stamp(deps)
+            entry = self.__entries.get(key)
+            if entry is not None:
+                stamp, expires, value = entry
+                if stamp == generations and (
+                        expires is None or time.monotonic() < expires):
+                    self.__entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.__entries[key]
+            self.misses += 1
+        value = getattr(self.__storage, method)(*args, **kwargs)
+        expires = None
+        if self.__ttl is not None:
+            expires = time.monotonic() + self.__ttl
+        with self.__lock:
+            # a write during the read makes the result unsafe to keep
+            if generations == self.__stamp(deps):
+                self.__entries[key] = (generations, expires, value)
+                self.__entries.move_to_end(key)
+                while len(self.__entries) > self.__size:
+                    self.__entries.popitem(last=False)
+        return value
+
+    def __stamp(self, deps):
+        """Returns the current generations of deps"""
+        return (self.__epoch,) + tuple(
+            self.__generations.get(c, 0) for c in deps)
+
+    def __bump(self, classes, pending=True):
+        """Invalidates the entries read from classes
+
+        Keyword Arguments:
+            pending -- Whether the next save() invalidates them again
+                (default: {True})
+        """
+        with self.__lock:
+            for cls in set(classes) | {self.__every}:
+                self.__generations[cls] = self.__generations.get(cls, 0) + 1
+            if pending:
+                self.__pending.update(classes)
+
+    def new(self, obj):
+        """Adds obj to the storage"""
+        self.__storage.new(obj)
+        self.__bump({type(obj)})
+
+    def new_many(self, objects):
+        """Queues objects for the next bulk_save()"""
+        objects = list(objects)
+        self.__storage.new_many(objects)
+        self.__bump({type(obj) for obj in objects})
+
+    def delete(self, obj=None):
+        """Deletes obj from the storage"""
+        self.__storage.delete(obj)
+        if obj is not None:
+            self.__bump(_cascade(type(obj)))
+
+    def delete_where(self, cls, filters=None):
+        """Deletes the objects of cls matching filters"""
+        try:
+            return self.__storage.delete_where(cls, filters)
+        finally:
+            self.__bump(_cascade(cls))
+
+    def save(self):
+        """Saves the storage"""
+        self.__save(self.__storage.save)
+
+    def bulk_save(self, *args, **kwargs):
+        """Saves the objects queued by new_many()"""
+        self.__save(self.__storage.bulk_save, *args, **kwargs)
+
+    def __save(self, save, *args, **kwargs):
+        """Runs save and invalidates the classes of the objects it
+        writes, as told by storage.unsaved(), along with the classes
+        written through the cache since the last save. Every entry is
+        dropped when the storage cannot tell.
+        """
+        unsaved = getattr(self.__storage, 'unsaved', None)
+        classes = None if unsaved is None else unsaved()
+        try:
+            save(*args, **kwargs)
+        finally:
+            with self.__lock:
+                pending, self.__pending = self.__pending, set()
+            if classes is None:
+                self.clear()
+            else:
+                self.__bump(pending | classes, pending=False)
+
+    def reload(self):
+        """Reloads the storage and drops every entry"""
+        self.__storage.reload()
+        self.clear()
+
+    def close(self):
+        """Closes the storage
+
+        Entries are dropped when a FileStorage finds its files were
+        changed by another process.
+        """
+        changed = getattr(self.__storage, 'changed', None)
+        if changed is not None and changed():
+            self.clear()
+        self.__storage.close()
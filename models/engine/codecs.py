@@ -0,0 +1,578 @@
+#!/usr/bin/python3
+"""This module defines the on-disk formats FileStorage can use.
+
+A codec turns the {key: record} mapping of a store into the content of a
+file and back:
+    record(obj) -- Returns the record of one model instance.
+    dumps(records) -- Returns the file content (str or bytes).
+    loads(data) -- Returns the records held in a file content.
+    binary -- True if the file content is bytes.
+    suffix -- File name suffix of the shards written with the codec.
+
+Codecs may also stream, one record at a time:
+    dump_iter(items) -- Yields the file content for (key, record) pairs.
+    load_iter(f) -- Yields the (key, record) pairs read from file f.
+
+JSONCodec is the default and keeps the historical file.json format.
+BinaryCodec is a compact struct based format that stores datetimes
+natively and keeps field names, class names and foreign keys in a shared
+string table. It is about half the size of JSON but not faster to read:
+its decoder is pure Python, slower than the C JSON parser. MappedCodec
+adds an offset index to the binary format so a snapshot can be opened
+with mmap and its records decoded on demand.
+
+Converting a store from one format to another:
+    python3 -m models.engine.codecs <src> <src codec> <dst> <dst codec>
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+_U8 = struct.Struct('<B')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+_ENTRY = struct.Struct('<QI')
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+_NONE, _TRUE, _FALSE, _INT, _FLOAT, _STR, _REF, _DATETIME, _LIST, _DICT = \
+    range(10)
+
+
+class JSONCodec:
+    """The historical JSON file format"""
+    name = 'json'
+    suffix = '.json'
+    binary = False
+
+    def record(self, obj):
+        """Returns the record of obj"""
+        return obj.to_dict()
+
+    def dumps(self, records):
+        """Returns the JSON document holding records"""
+        return json.dumps(records)
+
+    def loads(self, data):
+        """Returns the records held in a JSON document"""
+        return json.loads(data)
+
+    def dump_iter(self, items):
+        """Yields the JSON document holding the (key, record) pairs
+
+        The output is the same as dumps() but only one record is encoded
+        at a time.
+        """
+        yield '{'
+        separator = ''
+        for key, record in items:
+            yield separator + json.dumps(key) + ': ' + json.dumps(record)
+            separator = ', '
+        yield '}'
+
+    def load_iter(self, f, chunk_size=64 * 1024):
+        """Yields the (key, record) pairs of the JSON document in file f
+
+        The file is read chunk_size characters at a time and each record
+        is decoded as soon as it is complete, so neither the whole text
+        nor the whole decoded tree are ever held in memory.
+        """
+        decoder = json.JSONDecoder()
+        buf, pos, eof = '', 0, False
+        # json.loads shares field name strings between records, do it too
+        names = {}
+
+        def more():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+
+        def skip():
+            nonlocal pos
+            while True:
+                pos = _WHITESPACE.match(buf, pos).end()
+                if pos < len(buf) or eof:
+                    return
+                more()
+
+        def expect(chars):
+            nonlocal pos
+            skip()
+            if pos >= len(buf) or buf[pos] not in chars:
+                raise json.JSONDecodeError(
+                    'Expecting one of {!r}'.format(chars), buf, pos)
+            pos += 1
+            return buf[pos - 1]
+
+        def value():
+            nonlocal pos
+            skip()
+            while True:
+                try:
+                    val, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    more()
+                    continue
+                pos = end
+                return val
+
+        expect('{')
+        skip()
+        if buf[pos:pos + 1] == '}':
+            pos += 1
+        else:
+            while True:
+                key = value()
+                expect(':')
+                record = value()
+                if isinstance(record, dict):
+                    record = {
+                        names.setdefault(name, name): val
+                        for name, val in record.items()
+                        }
+                yield key, record
+                if expect(',}') == '}':
+                    break
+        skip()
+        if pos < len(buf):
+            raise json.JSONDecodeError('Extra data', buf, pos)
+
+
+class _Encoder:
+    """Encodes records into tagged binary values sharing a string table"""
+
+    def __init__(self):
+        """Starts with an empty string table"""
+        self.strings = {}
+
+    def intern(self, string):
+        """Returns the string table index of string"""
+        index = self.strings.get(string)
+        if index is None:
+            index = self.strings[string] = len(self.strings)
+        return index
+
+    def string_table(self):
+        """Returns the encoded string table"""
+        out = [_U32.pack(len(self.strings))]
+        for string in self.strings:
+            raw = string.encode('utf-8')
+            out.append(_U32.pack(len(raw)) + raw)
+        return b''.join(out)
+
+    @staticmethod
+    def shared(name):
+        """Tells whether the values of field name go to the string table"""
+        return name == '__class__' or name.endswith('_id')
+
+    def record(self, record, out):
+        """Appends the encoded fields of record to the out list"""
+        out.append(_U32.pack(len(record)))
+        for name, val in record.items():
+            out.append(_U32.pack(self.intern(str(name))))
+            self.value(val, out, self.shared(name))
+
+    def value(self, val, out, shared=False):
+        """Appends the tagged encoding of val to the out list"""
+        if val is None:
+            out.append(_U8.pack(_NONE))
+        elif val is True:
+            out.append(_U8.pack(_TRUE))
+        elif val is False:
+            out.append(_U8.pack(_FALSE))
+        elif isinstance(val, int) and -2 ** 63 <= val < 2 ** 63:
+            out.append(_U8.pack(_INT) + _I64.pack(val))
+        elif isinstance(val, float):
+            out.append(_U8.pack(_FLOAT) + _F64.pack(val))
+        elif isinstance(val, str):
+            if shared:
+                out.append(_U8.pack(_REF) + _U32.pack(self.intern(val)))
+            else:
+                raw = val.encode('utf-8')
+                out.append(_U8.pack(_STR) + _U32.pack(len(raw)) + raw)
+        elif isinstance(val, datetime) and val.tzinfo is None:
+            micros = (val - _EPOCH) // _MICROSECOND
+            out.append(_U8.pack(_DATETIME) + _I64.pack(micros))
+        elif isinstance(val, (list, tuple)):
+            out.append(_U8.pack(_LIST) + _U32.pack(len(val)))
+            for item in val:
+                self.value(item, out)
+        elif isinstance(val, dict):
+            out.append(_U8.pack(_DICT))
+            self.record(val, out)
+        else:
+            # big ints, aware datetimes... keep them readable as str
+            self.value(val.isoformat() if isinstance(val, datetime)
+                       else str(val), out)
+
+
+class _Decoder:
+    """Decodes tagged binary values from a buffer"""
+
+    def __init__(self, buf, strings=()):
+        """Decodes from buf (bytes, memoryview or mmap)
+
+        Keyword Arguments:
+            strings -- The string table (default: {()})
+        """
+        self.buf = buf
+        self.strings = strings
+
+    def string_table(self, pos):
+        """Reads the string table at pos, returns the position after it"""
+        buf = self.buf
+        u32 = _U32.unpack_from
+        (count,) = u32(buf, pos)
+        pos += 4
+        strings = []
+        for _ in range(count):
+            (length,) = u32(buf, pos)
+            pos += 4
+            strings.append(str(buf[pos:pos + length], 'utf-8'))
+            pos += length
+        self.strings = strings
+        return pos
+
+    def record(self, pos):
+        """Returns the record at pos and the position after it"""
+        buf = self.buf
+        strings = self.strings
+        u32 = _U32.unpack_from
+        value = self.value
+        (length,) = u32(buf, pos)
+        pos += 4
+        record = {}
+        for _ in range(length):
+            name = strings[u32(buf, pos)[0]]
+            record[name], pos = value(pos + 4)
+        return record, pos
+
+    def value(self, pos):
+        """Returns the value at pos and the position after it"""
+        buf = self.buf
+        u32 = _U32.unpack_from
+        tag = buf[pos]
+        pos += 1
+        if tag == _REF:
+            return self.strings[u32(buf, pos)[0]], pos + 4
+        if tag == _STR:
+            (length,) = u32(buf, pos)
+            pos += 4
+            return str(buf[pos:pos + length], 'utf-8'), pos + length
+        if tag == _DATETIME:
+            micros = _I64.unpack_from(buf, pos)[0]
+            return _EPOCH + timedelta(microseconds=micros), pos + 8
+        if tag == _INT:
+            return _I64.unpack_from(buf, pos)[0], pos + 8
+        if tag == _FLOAT:
+            return _F64.unpack_from(buf, pos)[0], pos + 8
+        if tag == _NONE:
+            return None, pos
+        if tag == _TRUE:
+            return True, pos
+        if tag == _FALSE:
+            return False, pos
+        if tag == _DICT:
+            return self.record(pos)
+        if tag == _LIST:
+            (length,) = u32(buf, pos)
+            pos += 4
+            items = []
+            for _ in range(length):
+                item, pos = self.value(pos)
+                items.append(item)
+            return items, pos
+        raise ValueError('unknown value tag {}'.format(tag))
+
+
+class BinaryCodec:
+    """Compact binary file format built on the struct module
+
+    Layout (little endian):
+        b'HBNB' magic, format version (u8)
+        string table: count (u32), then length (u32) + utf-8 bytes each
+        records: count (u32), then field count (u32) + fields each
+        field: name string index (u32), tagged value
+
+    Values are tagged with one byte: None, True, False, int (i64), float
+    (f64), inline str, string table reference (u32), naive datetime
+    (i64 microseconds since the epoch), list and dict. The key of a
+    record is rebuilt from its '__class__' and 'id' fields.
+
+    Files are about half the size of the JSON ones, which is what the
+    format is for. Decoding runs in Python and takes about three times
+    as long as json.loads(); since timestamps need no parsing, building
+    the model instances afterwards takes about as long as from JSON.
+    """
+    name = 'binary'
+    suffix = '.hbnb'
+    binary = True
+    magic = b'HBNB'
+    version = 1
+
+    def record(self, obj):
+        """Returns the record of obj, keeping datetimes as they are"""
+        record = dict(obj.__dict__)
+        record.pop('_sa_instance_state', None)
+        record['__class__'] = obj.__class__.__name__
+        return record
+
+    def dumps(self, records):
+        """Returns the binary document holding records"""
+        encoder = _Encoder()
+        body = [_U32.pack(len(records))]
+        for record in records.values():
+            encoder.record(record, body)
+        head = self.magic + _U8.pack(self.version)
+        return b''.join([head, encoder.string_table()] + body)
+
+    def loads(self, data):
+        """Returns the records held in a binary document"""
+        if data[:5] != self.magic + _U8.pack(self.version):
+            raise ValueError('not a binary hbnb store')
+        decoder = _Decoder(memoryview(data))
+        pos = decoder.string_table(5)
+        (count,) = _U32.unpack_from(data, pos)
+        pos += 4
+        records = {}
+        for _ in range(count):
+            record, pos = decoder.record(pos)
+            records[record['__class__'] + '.' + record['id']] = record
+        return records
+
+
+class MappedCodec(BinaryCodec):
+    """Binary snapshot with an offset index, meant to be read with mmap
+
+    Layout (little endian):
+        b'HBNM' magic, format version (u8)
+        string table, as in the binary format
+        class table: count (u32), then for each class its name length
+            (u32) + utf-8 bytes, first key number (u32), key count (u32)
+        keys: count (u32), blob length (u32), NUL separated utf-8 keys
+            grouped by class
+        index: absolute offset (u64) + length (u32) of each key's record
+        records, as in the binary format
+
+    Processes opening the same snapshot share its pages through the page
+    cache, and a record is only decoded when it is looked up. Snapshots
+    are published with an atomic rename, so a reader keeps a consistent
+    view of the version it opened.
+    """
+    name = 'mapped'
+    suffix = '.hbnbm'
+    magic = b'HBNM'
+    version = 1
+
+    def dumps(self, records):
+        """Returns the indexed snapshot holding records"""
+        encoder = _Encoder()
+        groups = {}
+        for key in records:
+            if '\0' in key:
+                raise ValueError('NUL in key {!r}'.format(key))
+            groups.setdefault(key.partition('.')[0], []).append(key)
+
+        keys, entries, blobs, classes = [], [], [], []
+        offset = 0
+        for name, group in groups.items():
+            classes.append((name, len(keys), len(group)))
+            for key in group:
+                out = []
+                encoder.record(records[key], out)
+                blob = b''.join(out)
+                keys.append(key)
+                entries.append((offset, len(blob)))
+                blobs.append(blob)
+                offset += len(blob)
+
+        head = [self.magic + _U8.pack(self.version), encoder.string_table(),
+                _U32.pack(len(classes))]
+        for name, start, count in classes:
+            raw = name.encode('utf-8')
+            head.append(_U32.pack(len(raw)) + raw +
+                        _U32.pack(start) + _U32.pack(count))
+        key_blob = '\0'.join(keys).encode('utf-8')
+        head.append(_U32.pack(len(keys)) + _U32.pack(len(key_blob)))
+        head.append(key_blob)
+        base = sum(len(part) for part in head) + _ENTRY.size * len(keys)
+        head.extend(_ENTRY.pack(base + off, length) for off, length in entries)
+        return b''.join(head + blobs)
+
+    def loads(self, data):
+        """Returns all the records held in an indexed snapshot"""
+        snapshot = Snapshot(data)
+        return {key: snapshot[key] for key in snapshot.index}
+
+    def open(self, file_path):
+        """Maps the snapshot stored in file_path
+
+        Returns:
+            The os.stat_result of the file and its Snapshot.
+        """
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size == 0:
+                raise ValueError('empty snapshot {}'.format(file_path))
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return stat, Snapshot(buf)
+
+
+class Snapshot:
+    """Read-only view over an indexed snapshot, decoding on demand"""
+
+    def __init__(self, buf):
+        """Reads the header and the offset index of the snapshot in buf
+
+        Arguments:
+            buf -- bytes or mmap holding a MappedCodec snapshot.
+        """
+        if buf[:5] != MappedCodec.magic + _U8.pack(MappedCodec.version):
+            raise ValueError('not an indexed hbnb snapshot')
+        self.__decoder = _Decoder(memoryview(buf))
+        u32 = _U32.unpack_from
+        pos = self.__decoder.string_table(5)
+
+        (count,) = u32(buf, pos)
+        pos += 4
+        classes = []
+        for _ in range(count):
+            (length,) = u32(buf, pos)
+            pos += 4
+            name = str(buf[pos:pos + length], 'utf-8')
+            pos += length
+            classes.append((name, u32(buf, pos)[0], u32(buf, pos + 4)[0]))
+            pos += 8
+
+        count, length = u32(buf, pos), u32(buf, pos + 4)
+        count, length = count[0], length[0]
+        pos += 8
+        keys = str(buf[pos:pos + length], 'utf-8').split('\0') \
+            if count else []
+        pos += length
+        entries = list(_ENTRY.iter_unpack(
+            buf[pos:pos + _ENTRY.size * count]))
+        self.index = dict(zip(keys, entries))
+        self.__classes = {
+            name: (keys[start:start + count], entries[start:start + count])
+            for name, start, count in classes
+            }
+
+    def __getitem__(self, key):
+        """Decodes the record stored under key"""
+        return self.decode(self.index[key])
+
+    def decode(self, entry):
+        """Decodes the record at the (offset, length) index entry"""
+        return self.__decoder.record(entry[0])[0]
+
+    def by_class(self):
+        """Returns a SnapshotRecords mapping per class name"""
+        return {
+            name: SnapshotRecords(self, dict(zip(keys, entries)))
+            for name, (keys, entries) in self.__classes.items()
+            }
+
+
+class SnapshotRecords(MutableMapping):
+    """Records of a Snapshot, decoded when looked up
+
+    Records put in the mapping override the snapshot, and deleting a key
+    hides it, the snapshot itself is never modified.
+    """
+
+    def __init__(self, snapshot, entries):
+        """Exposes the given {key: index entry} of snapshot"""
+        self.__snapshot = snapshot
+        self.__entries = entries
+        self.__records = {}
+
+    def __getitem__(self, key):
+        """Returns the record of key, decoding it if needed"""
+        try:
+            return self.__records[key]
+        except KeyError:
+            return self.__snapshot.decode(self.__entries[key])
+
+    def __setitem__(self, key, record):
+        """Overrides the record of key"""
+        self.__entries.pop(key, None)
+        self.__records[key] = record
+
+    def __delitem__(self, key):
+        """Hides key"""
+        if self.__entries.pop(key, None) is None:
+            del self.__records[key]
+        else:
+            self.__records.pop(key, None)
+
+    def __iter__(self):
+        """Iterates over the keys, without decoding anything"""
+        yield from self.__entries
+        yield from self.__records
+
+    def __len__(self):
+        """Returns the number of records"""
+        return len(self.__entries) + len(self.__records)
+
+
+CODECS = {
+    codec.name: codec for codec in (JSONCodec, BinaryCodec, MappedCodec)
+    }
+
+
+def get_codec(name=None):
+    """Returns an instance of the codec called name (default: json)"""
+    try:
+        return CODECS[name or 'json']()
+    except KeyError:
+        raise ValueError('unknown storage codec {}'.format(name))
+
+
+def convert(src_path, src_codec, dst_path, dst_codec):
+    """Rewrites a store file from one codec to another.
+
+    Arguments:
+        src_path -- The store file to read.
+        src_codec -- Name of the codec src_path is written with.
+        dst_path -- The store file to write.
+        dst_codec -- Name of the codec to write dst_path with.
+
+    Returns:
+        The number of converted records.
+    """
+    from models.engine.journal import write_atomic
+
+    src_codec, dst_codec = get_codec(src_codec), get_codec(dst_codec)
+    with open(src_path, 'rb' if src_codec.binary else 'r') as f:
+        records = src_codec.loads(f.read())
+    if not dst_codec.binary:
+        # JSON has no datetime type, store them the way to_dict() does
+        records = {
+            key: {
+                name: val.isoformat() if isinstance(val, datetime) else val
+                for name, val in record.items()
+                } for key, record in records.items()
+            }
+    write_atomic(dst_path, dst_codec.dumps(records),
+                 'wb' if dst_codec.binary else 'w')
+    return len(records)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 5:
+        print('Usage: {} <src> <src codec> <dst> <dst codec>'.format(
+            sys.argv[0]))
+        sys.exit(1)
+    print(convert(*sys.argv[1:]))
@@ -1,7 +1,12 @@
 #!/usr/bin/python3
 """This module defines a class to manage db storage for hbnb clone"""
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import (
+    Column, Integer, MetaData, Table, create_engine, delete, func, insert,
+    inspect, select)
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import (
+    Session, joinedload, scoped_session, selectinload, sessionmaker)
+from sqlalchemy.sql.dml import UpdateBase
 from models.user import User
 from models.place import Place
 from models.state import State
@@ -10,77 +15,387 @@ from models.amenity import Amenity
 from models.review import Review
 
 from models.base_model import Base
+import itertools
 import os
+import weakref
+
+
+def _flag(name):
+    """Returns whether the environment variable name is set to a true
+    value: '1', 'true' or 'yes', in any case
+    """
+    return os.getenv(name, '').strip().lower() in ('1', 'true', 'yes')
+
 
 HBNB_MYSQL_USER = os.getenv('HBNB_MYSQL_USER')
 HBNB_MYSQL_PWD = os.getenv('HBNB_MYSQL_PWD')
 HBNB_MYSQL_DB = os.getenv('HBNB_MYSQL_DB')
 HBNB_MYSQL_HOST = os.getenv('HBNB_MYSQL_HOST')
 HBNB_ENV = os.getenv('HBNB_ENV')
+HBNB_BULK_BATCH = int(os.getenv('HBNB_BULK_BATCH', 1000))
+HBNB_DB_POOL_SIZE = int(os.getenv('HBNB_DB_POOL_SIZE', 5))
+HBNB_DB_MAX_OVERFLOW = int(os.getenv('HBNB_DB_MAX_OVERFLOW', 10))
+HBNB_DB_POOL_RECYCLE = int(os.getenv('HBNB_DB_POOL_RECYCLE', 3600))
+HBNB_DB_POOL_PRE_PING = _flag('HBNB_DB_POOL_PRE_PING')
+HBNB_DB_REPLICAS = os.getenv('HBNB_DB_REPLICAS')
+HBNB_DB_REPLICA_POLICY = os.getenv('HBNB_DB_REPLICA_POLICY', 'round-robin')
+
+# version of the schema the models expect: 1 created the tables, 2 added
+# their indexes. Bump it, and make upgrade() reach it, when they change.
+SCHEMA_VERSION = 2
+# kept out of Base.metadata, so the model tables never include it
+schema_table = Table('hbnb_schema', MetaData(),
+                     Column('version', Integer, nullable=False))
+
+# storages whose engine is disposed in forked children
+_storages = weakref.WeakSet()
+
+
+def _after_fork():
+    """Runs DBStorage.after_fork() in a forked child process"""
+    for storage in list(_storages):
+        storage.after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def round_robin():
+    """Returns a picker cycling through the replicas"""
+    counter = itertools.count()
+    return lambda replicas: replicas[next(counter) % len(replicas)]
+
+
+def least_busy():
+    """Returns a picker choosing the replica with the fewest connections
+    checked out of its pool
+    """
+    return lambda replicas: min(
+        replicas, key=lambda engine: engine.pool.checkedout())
+
+
+replica_policies = {'round-robin': round_robin, 'least-busy': least_busy}
+
+
+def _mapped(cls):
+    """Returns whether cls has a table, which BaseModel has not"""
+    return inspect(cls, raiseerr=False) is not None
+
+
+class RoutingSession(Session):
+    """Session reading from a replica and writing to the primary
+
+    Flushes and INSERT/UPDATE/DELETE statements go to the bound primary
+    engine. Reads go to a replica, chosen once per session. Once the
+    session has written, it reads from the primary too until it is
+    closed, so it sees its own writes whatever the replication lag.
+    """
+
+    def __init__(self, replicas=(), pick=None, **kwargs):
+        """Creates the session
+
+        Keyword Arguments:
+            replicas -- Engines of the replicas. Everything goes to the
+                primary when empty. (default: {()})
+            pick -- Callable returning one of replicas (default: {None})
+        """
+        super().__init__(**kwargs)
+        self.replicas = replicas
+        self.pick = pick
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        """Returns the engine a statement of the session runs on"""
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info['wrote'] = True
+        if not self.replicas or self.info.get('wrote'):
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if 'replica' not in self.info:
+            self.info['replica'] = self.pick(self.replicas)
+        return self.info['replica']
+
+    def flush(self, objects=None):
+        """Flushes the session, remembering the classes of the objects
+        it writes until the transaction ends
+        """
+        self.info.setdefault('flushed', set()).update(
+            type(obj) for obj in self.new | self.dirty | self.deleted)
+        super().flush(objects)
+
+    def commit(self):
+        """Commits the transaction"""
+        super().commit()
+        self.info.pop('flushed', None)
+
+    def rollback(self):
+        """Rolls the transaction back"""
+        super().rollback()
+        self.info.pop('flushed', None)
+
+    def close(self):
+        """Closes the session, its next reads go to a replica again"""
+        super().close()
+        self.info.pop('wrote', None)
+        self.info.pop('replica', None)
+        self.info.pop('flushed', None)
 
 
 class DBStorage:
     """This class manages storage of hbnb models in JSON format"""
     __engine = None
+    __classes = (User, Place, State, City, Amenity, Review)
     __session = None
+    __replicas = ()
+
+    def __init__(self, replicas=None, policy=None):
+        """Create the db engines
 
-    def __init__(self):
-        """Create the db engine
+        Each thread gets its own session from a registry, and close()
+        ends the session of the calling thread only, so a threaded
+        server can serve one session per request.
+
+        Reads run on a replica when there are some, see RoutingSession.
+        The schema is only created on the primary, the replicas are
+        expected to copy it.
+
+        Startup reads the schema version stored in the primary, and only
+        runs upgrade() when it is behind SCHEMA_VERSION. With HBNB_ENV
+        set to 'test', the tables are then emptied by truncate().
+
+        Keyword Arguments:
+            replicas -- Locations of the replicas, see
+                create_replica_engine(). Defaults to the comma separated
+                URLs of the HBNB_DB_REPLICAS environment variable.
+                (default: {None})
+            policy -- 'round-robin' or 'least-busy', how a session picks
+                its replica. Defaults to the HBNB_DB_REPLICA_POLICY
+                environment variable, then to 'round-robin'.
+                (default: {None})
         """
-        self.__engine = create_engine(
-            f"mysql+mysqldb://{HBNB_MYSQL_USER}:{HBNB_MYSQL_PWD}@"
-            f"{HBNB_MYSQL_HOST}/{HBNB_MYSQL_DB}",
-            pool_pre_ping=True)
+        if replicas is None:
+            replicas = [url for url in (HBNB_DB_REPLICAS or '').split(',')
+                        if url.strip()]
+        policy = policy or HBNB_DB_REPLICA_POLICY
+        if policy not in replica_policies:
+            raise ValueError('unknown replica policy: {}'.format(policy))
+        self.__engine = self.create_engine()
+        self.__replicas = tuple(
+            self.create_replica_engine(replica.strip())
+            for replica in replicas)
+        self.__pick = replica_policies[policy]()
+        _storages.add(self)
 
+        if self.schema_version() < SCHEMA_VERSION:
+            self.upgrade()
         if HBNB_ENV == 'test':
-            Base.metadata.drop_all(self.__engine)
+            self.truncate()
 
         self.reload()
 
-    def all(self, cls=None):
+    def create_engine(self):
+        """Returns the engine of the MySQL database
+
+        Subclasses override it to run the models on another database.
+        """
+        return create_engine(
+            f"mysql+mysqldb://{HBNB_MYSQL_USER}:{HBNB_MYSQL_PWD}@"
+            f"{HBNB_MYSQL_HOST}/{HBNB_MYSQL_DB}",
+            **self.pool_options())
+
+    def create_replica_engine(self, url):
+        """Returns the engine of the replica at url
+
+        Subclasses override it along with create_engine().
+        """
+        return create_engine(url, **self.pool_options())
+
+    def pool_options(self):
+        """Returns the connection pool settings of create_engine()
+
+        They come from the HBNB_DB_POOL_SIZE (default 5),
+        HBNB_DB_MAX_OVERFLOW (default 10), HBNB_DB_POOL_RECYCLE (seconds,
+        default 3600, below MySQL's default wait_timeout) and
+        HBNB_DB_POOL_PRE_PING environment variables. Pre-ping costs a
+        round trip per checkout, so it is off unless set to 1, true or
+        yes.
+        """
+        return {
+            'pool_size': HBNB_DB_POOL_SIZE,
+            'max_overflow': HBNB_DB_MAX_OVERFLOW,
+            'pool_recycle': HBNB_DB_POOL_RECYCLE,
+            'pool_pre_ping': HBNB_DB_POOL_PRE_PING,
+        }
+
+    def all(self, cls=None, load=None):
         """Returns a dictionary of models currently in storage
 
+        Keys are built from the class name and the id, without
+        serializing the rows. Only the tables of the requested classes
+        are queried, one SELECT each.
+
         Keyword Arguments:
-            cls -- If specified, one type of class has to be
-                returned (default: {None})
+            cls -- If specified, one type of class, or a list of classes,
+                has to be returned (default: {None})
+            load -- Relationships to load along with the objects, see
+                loader_options(). With several classes each path only
+                applies to the classes having it. (default: {None})
 
         Returns:
             List of objects.
         """
         all_objects = {}
+        if self.__session is None:
+            return all_objects
 
-        if cls is not None:
-            if self.__session is not None:
-                instances = self.__session.query(cls).all()
-                for instance in instances:
-                    all_objects.update(
-                        {
-                            '.'.join([
-                                instance.to_dict()['__class__'],
-                                instance.id
-                                ]): instance
-                            }
-                        )
-
+        if cls is None:
+            classes = DBStorage.__classes
+        elif isinstance(cls, (list, tuple, set)):
+            classes = cls
         else:
+            classes = (cls,)
 
-            all_cls = [User, Place, State, City, Amenity, Review]
-
-            for _cls in all_cls:
-                if self.__session is not None:
-                    instances = self.__session.query(_cls).all()
-                    for instance in instances:
-                        all_objects.update(
-                            {
-                                '.'.join([
-                                    instance.to_dict()['__class__'],
-                                    instance.id
-                                    ]): instance
-                                }
-                            )
+        for _cls in classes:
+            if not _mapped(_cls):
+                continue
+            prefix = _cls.__name__ + '.'
+            paths = load
+            if load and len(classes) > 1:
+                relationships = inspect(_cls).relationships
+                paths = [path for path in load
+                         if path.split('.')[0] in relationships]
+            query = select(_cls).options(*self.loader_options(_cls, paths))
+            for instance in self.__session.scalars(query):
+                all_objects[prefix + instance.id] = instance
 
         return all_objects
 
+    def get(self, cls, id, load=None):
+        """Returns the object of cls with the given id, or None
+
+        A primary key lookup, answered from the session without a query
+        when the object is already loaded.
+
+        Keyword Arguments:
+            load -- Relationships to load along with the object, see
+                loader_options(). (default: {None})
+        """
+        if self.__session is None or not _mapped(cls):
+            return None
+        return self.__session.get(
+            cls, id, options=self.loader_options(cls, load))
+
+    def count(self, cls=None):
+        """Returns the number of objects of cls, or of all classes
+
+        Runs a SELECT COUNT(*) per class instead of loading the rows.
+        """
+        if self.__session is None:
+            return 0
+        return sum(
+            self.__session.query(func.count(_cls.id)).scalar()
+            for _cls in ([cls] if cls is not None else DBStorage.__classes)
+            if _mapped(_cls)
+            )
+
+    def query(self, cls, filters=None, order_by=None, limit=None, offset=0,
+              load=None):
+        """Returns the objects of cls matching filters, in order
+
+        The filters, ordering and paging are compiled into a single
+        SELECT, so only the matching rows are read.
+
+        Arguments:
+            cls -- Class of the objects to return.
+
+        Keyword Arguments:
+            filters -- {column: value} pairs the objects have to be equal
+                to (default: {None})
+            order_by -- Column name, or list of column names, to sort by.
+                A name starting with '-' sorts in descending order.
+                (default: {None})
+            limit -- Maximum number of objects returned (default: {None})
+            offset -- Number of matching objects skipped (default: {0})
+            load -- Relationships to load along with the objects, see
+                loader_options(). (default: {None})
+
+        Returns:
+            Dictionary of the matching objects.
+        """
+        if self.__session is None or not _mapped(cls):
+            return {}
+        query = self.__session.query(cls).options(
+            *self.loader_options(cls, load))
+        if filters:
+            query = query.filter_by(**filters)
+        if isinstance(order_by, str):
+            order_by = (order_by,)
+        for column in order_by or ():
+            if column.startswith('-'):
+                query = query.order_by(getattr(cls, column[1:]).desc())
+            else:
+                query = query.order_by(getattr(cls, column))
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return {cls.__name__ + '.' + obj.id: obj for obj in query}
+
+    def iter(self, cls, batch_size=1000, load=None):
+        """Yields the objects of cls, fetching batch_size rows at a time
+
+        Rows are streamed with yield_per from a server-side cursor and
+        the session only keeps weak references to clean objects, so
+        memory stays flat whatever the size of the table as long as the
+        caller does not keep the objects.
+
+        Arguments:
+            cls -- Class of the objects to yield.
+
+        Keyword Arguments:
+            batch_size -- Rows fetched per round trip (default: {1000})
+            load -- Relationships to load along with each batch, see
+                loader_options(). (default: {None})
+        """
+        if self.__session is None or not _mapped(cls):
+            return
+        yield from self.__session.scalars(
+            select(cls).options(*self.loader_options(cls, load))
+            .execution_options(yield_per=batch_size))
+
+    @staticmethod
+    def loader_options(cls, load):
+        """Returns the SQLAlchemy loader options of relationship paths
+
+        Each path is a relationship name of cls, or a dotted chain of
+        names such as 'cities.places'. Many-to-one relationships are
+        joined to the main query, collections are loaded with one more
+        SELECT ... IN per path, so the number of queries does not grow
+        with the number of rows.
+
+        Arguments:
+            cls -- Class the paths start from.
+            load -- Iterable of paths, or None.
+
+        Returns:
+            List of loader options.
+        """
+        options = []
+        for path in load or ():
+            option = None
+            owner = cls
+            for name in path.split('.'):
+                attr = getattr(owner, name)
+                relationship = attr.property
+                strategy = (selectinload if relationship.uselist
+                            else joinedload)
+                if option is None:
+                    option = strategy(attr)
+                else:
+                    option = getattr(option, strategy.__name__)(attr)
+                owner = relationship.mapper.class_
+            options.append(option)
+        return options
+
     def new(self, obj):
         """Adds new object to the session"""
         if self.__session is not None:
@@ -91,31 +406,246 @@ class DBStorage:
         if self.__session is not None:
             self.__session.commit()
 
+    def unsaved(self):
+        """Returns the classes of the objects the next save() or
+        bulk_save() of the current session writes: the objects added,
+        modified or deleted, including the ones already flushed, and the
+        objects queued by new_many()
+        """
+        if self.__session is None:
+            return set()
+        session = self.__session
+        classes = {type(obj) for obj in
+                   session.new | session.dirty | session.deleted}
+        classes.update(session.info.get('flushed', ()))
+        classes.update(type(obj) for obj in session.info.get('bulk', ()))
+        return classes
+
+    def new_many(self, objects):
+        """Queues objects for the next bulk_save() of the current session
+
+        Arguments:
+            objects -- Iterable of new model instances.
+        """
+        if self.__session is not None:
+            self.__session.info.setdefault('bulk', []).extend(objects)
+
+    def bulk_save(self, batch_size=None):
+        """Inserts the objects queued by new_many() in one transaction
+
+        Rows are sent with executemany INSERTs of batch_size rows, parent
+        tables first, without going through the session's unit of work:
+        the objects are not attached to the session and relationships
+        set on them (such as Place.amenities) are not saved.
+
+        Keyword Arguments:
+            batch_size -- Rows per INSERT. Defaults to the HBNB_BULK_BATCH
+                environment variable, then to 1000. (default: {None})
+        """
+        if self.__session is None:
+            return
+        objects = self.__session.info.pop('bulk', None)
+        if not objects:
+            return
+        batch_size = batch_size or HBNB_BULK_BATCH
+        rows = {}
+        for obj in objects:
+            mapper = inspect(type(obj))
+            # only the attributes set, so column defaults still apply
+            rows.setdefault(mapper.local_table, (type(obj), []))[1].append({
+                column.key: obj.__dict__[column.key]
+                for column in mapper.column_attrs
+                if column.key in obj.__dict__
+                })
+        try:
+            for table in Base.metadata.sorted_tables:
+                if table not in rows:
+                    continue
+                cls, values = rows[table]
+                for start in range(0, len(values), batch_size):
+                    self.__session.execute(
+                        insert(cls), values[start:start + batch_size])
+            self.__session.commit()
+        except Exception:
+            self.__session.rollback()
+            raise
+
     def delete(self, obj=None):
         """Delete obj from the session if it's inside.
 
+        Its row, and the ones its relationships cascade to, are deleted
+        by the next save(). An object added and not saved yet is only
+        taken out of the session, one never added is left alone.
+
         Keyword Arguments:
             obj -- Object to be deleted. (default: {None})
         """
-        if obj is not None:
-            if self.__session is not None:
-                self.__session.query(obj).delete()
+        if obj is None or self.__session is None:
+            return
+        state = inspect(obj, raiseerr=False)
+        if state is None or state.transient:
+            return
+        if state.pending:
+            self.__session.expunge(obj)
+        else:
+            self.__session.delete(obj)
 
-    def reload(self):
-        """creates a new session"""
+    def delete_where(self, cls, filters=None):
+        """Deletes the objects of cls matching filters, without loading them
+
+        The rows referencing them through a foreign key are deleted
+        first, the same way, so the cascade costs one DELETE ... WHERE
+        per table reached rather than one per row. The deletion is
+        committed by the next save().
+
+        Arguments:
+            cls -- Class of the objects to delete.
+
+        Keyword Arguments:
+            filters -- {column: value} pairs the objects have to be equal
+                to. All the objects of cls when empty. A column cls does
+                not have matches nothing. (default: {None})
+
+        Returns:
+            The number of objects of cls deleted.
+        """
+        if self.__session is None or not _mapped(cls):
+            return 0
+        table = cls.__table__
+        if not set(filters or ()) <= set(table.c.keys()):
+            return 0
+        criteria = [
+            table.c[column] == value
+            for column, value in (filters or {}).items()
+            ]
+        count = self.__delete_rows(table, criteria)
+        # objects already loaded must not outlive their rows
+        self.__session.expire_all()
+        return count
+
+    def __delete_rows(self, table, criteria):
+        """Deletes the rows of table matching criteria, and the rows of
+        the other tables referencing them first
+        """
+        for child in Base.metadata.sorted_tables:
+            for fk in child.foreign_keys:
+                if fk.column.table is table:
+                    parents = select(fk.column).where(*criteria)
+                    self.__delete_rows(child, [fk.parent.in_(parents)])
+        return self.__session.execute(
+            delete(table).where(*criteria)).rowcount
+
+    def migrate(self):
+        """Adds the indexes declared on the models to existing tables
+
+        create_all() only creates missing tables, with their indexes, so
+        an index declared after its table was created is never built.
+        An index is skipped when the table already has one starting with
+        the same columns, such as the one MySQL adds for a foreign key.
+        Only the primary is migrated, the replicas copy it.
+
+        Returns:
+            List of the names of the indexes created.
+        """
+        created = []
+        with self.__engine.begin() as conn:
+            inspector = inspect(conn)
+            tables = set(inspector.get_table_names())
+            for table in Base.metadata.sorted_tables:
+                if table.name not in tables:
+                    continue
+                existing = [index['column_names']
+                            for index in inspector.get_indexes(table.name)]
+                for index in sorted(table.indexes, key=lambda i: i.name):
+                    columns = [column.name for column in index.columns]
+                    if any(names[:len(columns)] == columns
+                           for names in existing):
+                        continue
+                    index.create(conn)
+                    created.append(index.name)
+        return created
+
+    def schema_version(self):
+        """Returns the schema version stored in the primary
+
+        A single SELECT, without reflecting the tables.
+
+        Returns:
+            The version, or 0 when none was stored yet.
+        """
+        try:
+            with self.__engine.connect() as conn:
+                return conn.scalar(select(schema_table.c.version)) or 0
+        except DBAPIError:
+            return 0
+
+    def upgrade(self):
+        """Brings the schema of the primary to SCHEMA_VERSION
+
+        Creates the missing tables, then their missing indexes with
+        migrate(), and stores the version. Each step is idempotent, so
+        databases created before the version was stored are upgraded
+        the same way.
+
+        Returns:
+            List of the names of the indexes created.
+        """
         Base.metadata.create_all(self.__engine)
-        Session = sessionmaker(bind=self.__engine, expire_on_commit=False)
-        self.__session = scoped_session(Session)()
+        created = self.migrate()
+        with self.__engine.begin() as conn:
+            schema_table.create(conn, checkfirst=True)
+            conn.execute(delete(schema_table))
+            conn.execute(insert(schema_table), {'version': SCHEMA_VERSION})
+        return created
+
+    def truncate(self):
+        """Deletes the rows of every model table, keeping the schema"""
+        with self.__engine.begin() as conn:
+            if conn.dialect.name == 'mysql':
+                quote = conn.dialect.identifier_preparer.quote
+                conn.exec_driver_sql('SET FOREIGN_KEY_CHECKS = 0')
+                for table in Base.metadata.sorted_tables:
+                    conn.exec_driver_sql(
+                        'TRUNCATE TABLE {}'.format(quote(table.name)))
+                conn.exec_driver_sql('SET FOREIGN_KEY_CHECKS = 1')
+            else:
+                for table in reversed(Base.metadata.sorted_tables):
+                    conn.execute(delete(table))
+
+    def reload(self):
+        """creates a new session registry"""
+        if self.__session is not None:
+            self.__session.remove()
+        Session = sessionmaker(
+            class_=RoutingSession, bind=self.__engine,
+            replicas=self.__replicas, pick=self.__pick,
+            expire_on_commit=False)
+        self.__session = scoped_session(Session)
 
     def close(self):
         """
         Closes the current database session.
 
-        This method is part of the DBStorage class that manages storage of
-        hbnb models in a database.
+        Only the session of the calling thread is closed and discarded,
+        the next access opens a fresh one. The web apps call it at the
+        end of every request.
 
         Parameters: None
 
         Returns: None
         """
-        self.__session.close()
+        if self.__session is not None:
+            self.__session.remove()
+
+    def after_fork(self):
+        """Drops what a forked child inherited from its parent
+
+        The pooled connections belong to the parent: the child gets a
+        new pool without closing them, and forgets the inherited session
+        instead of closing it. Registered with os.register_at_fork, so
+        pre-forking servers need no hook.
+        """
+        for engine in (self.__engine,) + self.__replicas:
+            engine.dispose(close=False)
+        if self.__session is not None:
+            self.__session.registry.clear()
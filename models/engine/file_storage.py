@@ -1,47 +1,695 @@
 #!/usr/bin/python3
 """This module defines a class to manage file storage for hbnb clone"""
-import json
+import functools
+import os
+import threading
+from types import MappingProxyType
+from models.engine.codecs import get_codec
+from models.engine.journal import Journal, write_atomic
+from models.engine.locking import StoreLock
+from models.engine.write_behind import WriteBehind
+
+HBNB_FILE_JOURNAL = os.getenv('HBNB_FILE_JOURNAL')
+HBNB_FILE_JOURNAL_MAX = int(os.getenv('HBNB_FILE_JOURNAL_MAX', 1024 * 1024))
+HBNB_FILE_SHARDS = os.getenv('HBNB_FILE_SHARDS')
+HBNB_FILE_CODEC = os.getenv('HBNB_FILE_CODEC')
+HBNB_FILE_WRITE_BEHIND = os.getenv('HBNB_FILE_WRITE_BEHIND')
+HBNB_FILE_WRITE_BEHIND_MAX = int(
+    os.getenv('HBNB_FILE_WRITE_BEHIND_MAX', 1000))
+
+
+def file_signature(stat):
+    """Returns what identifies one version of a file on disk.
+
+    Arguments:
+        stat -- os.stat_result of the file, or None if it does not exist.
+    """
+    if stat is None:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def stat_or_none(file_path):
+    """Returns os.stat(file_path), or None if the file does not exist."""
+    try:
+        return os.stat(file_path)
+    except FileNotFoundError:
+        return None
+
+
+def synchronized(method):
+    """Runs a FileStorage method holding the storage lock, so it never
+    overlaps a commit of the write-behind thread
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._FileStorage__lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class FileStorage:
-    """This class manages storage of hbnb models in JSON format"""
+    """This class manages storage of hbnb models in JSON format
+
+    The read methods accept the load argument of DBStorage, so callers
+    work with both engines, but do nothing with it: objects are returned
+    as stored and no relationship is loaded along with them.
+    """
     __file_path = 'file.json'
-    __objects = {}
+    __foreign_keys = {
+        'City': ('state_id',),
+        'Place': ('city_id', 'user_id'),
+        'Review': ('place_id', 'user_id'),
+    }
+    # class name -> (class name, foreign key) pairs referencing it
+    __references = {
+        'State': (('City', 'state_id'),),
+        'City': (('Place', 'city_id'),),
+        'User': (('Place', 'user_id'), ('Review', 'user_id')),
+        'Place': (('Review', 'place_id'),),
+    }
+
+    def __init__(self, file_path=None, journal=None, shards=None,
+                 codec=None, write_behind=None):
+        """Creates the storage engine
 
-    def all(self, cls=None):
+        Keyword Arguments:
+            file_path -- The JSON snapshot file (default: {'file.json'})
+            journal -- Append changes to a journal file instead of
+                rewriting the snapshot on every save. Defaults to the
+                HBNB_FILE_JOURNAL environment variable. (default: {None})
+            shards -- Store each class in its own file under the
+                '<file_path>.d' directory. Only the shards of classes
+                changed since the last save are rewritten, and a shard is
+                only read once its class is accessed. Defaults to the
+                HBNB_FILE_SHARDS environment variable. (default: {None})
+            codec -- Name of the on-disk format, 'json', 'binary' or
+                'mapped' (see models.engine.codecs). Defaults to the
+                HBNB_FILE_CODEC environment variable, then to 'json'.
+                (default: {None})
+            write_behind -- Delay in milliseconds. When set, save() only
+                marks the store dirty and a background thread writes it
+                at most that often, or once HBNB_FILE_WRITE_BEHIND_MAX
+                saves are waiting. flush() and close() wait for the
+                write. Defaults to the HBNB_FILE_WRITE_BEHIND environment
+                variable. (default: {None})
+
+        Several processes can share the same store: commits hold an
+        exclusive fcntl lock on '<file_path>.lock' and merge their
+        changes into what the others committed meanwhile, readers hold
+        a shared one. The lock file also holds the store version, so
+        close() only reads the store again once it moved.
+        """
+        self.__file_path = file_path or FileStorage.__file_path
+        self.__codec = get_codec(codec or HBNB_FILE_CODEC)
+        self.__objects = {}
+        self.__by_class = {}
+        self.__fk_index = {}
+        self.__fk_values = {}
+        self.__raw = {}
+        self.__records_cache = {}
+        self.__pending = set()
+        # objects modified since the last commit, filled by BaseModel
+        self.__dirty = set()
+        self.__snapshot_sig = None
+        self.__journal_ino = None
+        self.__journal_offset = 0
+        self.__store_lock = StoreLock(self.__file_path + '.lock')
+        self.__version = 0
+        if journal is None:
+            journal = bool(HBNB_FILE_JOURNAL)
+        if shards is None:
+            shards = bool(HBNB_FILE_SHARDS)
+        if journal and shards:
+            raise ValueError('journal mode needs the single file layout')
+        self.__shard_dir = self.__file_path + '.d' if shards else None
+        self.__shards = {}
+        self.__journal = None
+        if journal:
+            self.__journal = Journal(
+                self.__file_path, max_size=HBNB_FILE_JOURNAL_MAX,
+                codec=self.__codec, lock=self.__store_lock)
+        self.__lock = threading.RLock()
+        if write_behind is None:
+            write_behind = HBNB_FILE_WRITE_BEHIND
+        self.__writer = None
+        if write_behind:
+            self.__writer = WriteBehind(
+                self.__commit, delay=float(write_behind) / 1000,
+                max_pending=HBNB_FILE_WRITE_BEHIND_MAX)
+
+    @synchronized
+    def all(self, cls=None, view=False, load=None):
         """Returns a dictionary of models currently in storage
 
         Keyword Arguments:
             cls -- If specified, one type of class has to be
                 returned (default: {None})
+            view -- Return a read-only view of the per-class index
+                instead of a copy. The view follows later changes to
+                the storage. (default: {False})
+            load -- Ignored, see FileStorage. (default: {None})
 
         Returns:
             List of objects.
         """
 
         if cls is None:
-            return FileStorage.__objects
+            self.__access(self.classes())
+            return self.__objects
+
+        self.__access((cls.__name__,))
+        objects = self.__by_class.setdefault(cls, {})
+        if view:
+            return MappingProxyType(objects)
+        return dict(objects)
 
+    @synchronized
+    def lookup(self, cls, column, value):
+        """Returns the objects of cls whose column equals value
+
+        Foreign key columns are answered from a secondary index, any
+        other column falls back to a scan of the class index. Objects
+        whose foreign key was assigned since they were indexed are
+        refiled first, saved or not.
+
+        Arguments:
+            cls -- Class of the objects to return.
+            column -- Name of the attribute to match.
+            value -- Value the attribute has to be equal to.
+
+        Returns:
+            Dictionary of the matching objects.
+        """
+        name = cls.__name__
+        self.__access((name,))
+        if column not in FileStorage.__foreign_keys.get(name, ()):
+            return {
+                key: obj for key, obj in self.__by_class.get(cls, {}).items()
+                if getattr(obj, column, None) == value
+                }
+        self.__refile(name)
+        objects = self.__fk_index.get((name, column), {}).get(value, {})
         return {
-            key: value for (key, value) in FileStorage.__objects.items()
-            if value.__class__ is cls
+            key: obj for key, obj in objects.items()
+            if getattr(obj, column, None) == value
             }
 
+    @synchronized
+    def get(self, cls, id, load=None):
+        """Returns the object of cls with the given id, or None
+
+        Only that object is hydrated, not the rest of its class.
+
+        Keyword Arguments:
+            load -- Ignored, see FileStorage. (default: {None})
+        """
+        obj = self.__get(cls.__name__ + '.' + str(id))
+        return obj if isinstance(obj, cls) else None
+
+    @synchronized
+    def count(self, cls=None):
+        """Returns the number of objects of cls, or of all classes
+
+        Records not hydrated yet are counted without being built.
+        """
+        classes = self.classes()
+        names = list(classes) if cls is None else [cls.__name__]
+        self.__load_shards(names)
+        return sum(
+            len(self.__by_class.get(classes.get(name, cls), ())) +
+            len(self.__raw.get(name, ()))
+            for name in names
+            )
+
+    def iter(self, cls, batch_size=1000, load=None):
+        """Yields the objects of cls, building batch_size at a time
+
+        Objects already hydrated are yielded as they are. The records
+        not hydrated yet are turned into instances one batch at a time
+        and are not kept by the storage, so memory stays flat with the
+        lazy layouts. Such an instance is only stored again by its
+        save(), or by storage.new().
+
+        Meant for one-off passes such as exports: every call builds the
+        records not hydrated yet again, while all() and query() build
+        them once and keep them.
+
+        Arguments:
+            cls -- Class of the objects to yield.
+
+        Keyword Arguments:
+            batch_size -- Objects built per batch (default: {1000})
+            load -- Ignored, see FileStorage. (default: {None})
+        """
+        name = cls.__name__
+        with self.__lock:
+            self.__load_shards((name,))
+            hydrated = list(self.__by_class.get(cls, {}).values())
+            keys = list(self.__raw.get(name, ()))
+        yield from hydrated
+
+        classes = self.classes()
+        for start in range(0, len(keys), batch_size):
+            batch = []
+            with self.__lock:
+                raw = self.__raw.get(name, {})
+                for key in keys[start:start + batch_size]:
+                    if key in raw:
+                        val = raw[key]
+                        batch.append(classes[val['__class__']](**val))
+                    elif key in self.__objects:
+                        # hydrated since the iteration started
+                        batch.append(self.__objects[key])
+            yield from batch
+
+    @synchronized
+    def query(self, cls, filters=None, order_by=None, limit=None, offset=0,
+              load=None):
+        """Returns the objects of cls matching filters, in order
+
+        An id filter is answered by a single key lookup and a foreign
+        key filter from its index, other filters scan the class.
+
+        Arguments:
+            cls -- Class of the objects to return.
+
+        Keyword Arguments:
+            filters -- {column: value} pairs the objects have to be equal
+                to (default: {None})
+            order_by -- Column name, or list of column names, to sort by.
+                A name starting with '-' sorts in descending order.
+                Missing values sort first in ascending order and last
+                in descending order. (default: {None})
+            limit -- Maximum number of objects returned (default: {None})
+            offset -- Number of matching objects skipped (default: {0})
+            load -- Ignored, see FileStorage. (default: {None})
+
+        Returns:
+            Dictionary of the matching objects.
+        """
+        name = cls.__name__
+        filters = filters or {}
+        if 'id' in filters:
+            obj = self.get(cls, filters['id'])
+            candidates = {} if obj is None else {name + '.' + obj.id: obj}
+        else:
+            self.__access((name,))
+            indexed = [
+                column for column in FileStorage.__foreign_keys.get(name, ())
+                if column in filters
+                ]
+            if indexed:
+                self.__refile(name)
+                candidates = self.__fk_index.get(
+                    (name, indexed[0]), {}).get(filters[indexed[0]], {})
+            else:
+                candidates = self.__by_class.get(cls, {})
+        matches = [
+            (key, obj) for key, obj in candidates.items()
+            if all(hasattr(obj, column) and getattr(obj, column) == value
+                   for column, value in filters.items())
+            ]
+
+        if isinstance(order_by, str):
+            order_by = (order_by,)
+        for column in reversed(order_by or ()):
+            descending = column.startswith('-')
+            column = column.lstrip('-')
+            matches.sort(key=lambda item: (
+                getattr(item[1], column, None) is not None,
+                getattr(item[1], column, None)), reverse=descending)
+
+        if limit is not None:
+            matches = matches[offset:offset + limit]
+        elif offset:
+            matches = matches[offset:]
+        return dict(matches)
+
+    def __access(self, names):
+        """Makes the objects of the given class names available
+
+        Reads their shards if needed and builds the model instances of
+        the records still waiting for hydration.
+        """
+        self.__load_shards(names)
+        if not self.__raw:
+            return
+        classes = self.classes()
+        for name in names:
+            for key, val in self.__raw.pop(name, {}).items():
+                self.__hydrate(classes, key, val)
+
+    def __hydrate(self, classes, key, val):
+        """Builds the model instance of a record read from disk"""
+        obj = classes[val['__class__']](**val)
+        self.__add(key, obj)
+        # the record read is what the clean object serializes to
+        self.__records_cache[key] = val
+        return obj
+
+    def __get(self, key):
+        """Returns the object stored under key, or None
+
+        Only that object is hydrated, not the rest of its class.
+        """
+        name = key.partition('.')[0]
+        self.__load_shards((name,))
+        obj = self.__objects.get(key)
+        if obj is None:
+            raw = self.__raw.get(name)
+            if raw and key in raw:
+                obj = self.__hydrate(self.classes(), key, raw.pop(key))
+        return obj
+
+    def __stage(self, groups):
+        """Files records read from disk, hydrated on first access
+
+        Arguments:
+            groups -- {class name: {key: record}} mappings. They are kept
+                as they are, so the records of a mapped snapshot are only
+                decoded once their class is accessed. The records of a
+                class already hydrated are hydrated at once, so the views
+                returned by all() keep following it.
+        """
+        classes = self.classes()
+        for name, records in groups.items():
+            if (name in classes and name not in self.__raw and
+                    classes[name] in self.__by_class):
+                for key, val in records.items():
+                    self.__hydrate(classes, key, val)
+                continue
+            if self.__objects:
+                for key in records:
+                    self.__remove(key)
+            raw = self.__raw.get(name)
+            if raw is None:
+                self.__raw[name] = records
+            else:
+                for key in records:
+                    raw[key] = records[key]
+
+    def __discard(self, key):
+        """Drops key whether it is hydrated or not"""
+        self.__remove(key)
+        raw = self.__raw.get(key.partition('.')[0])
+        if raw:
+            raw.pop(key, None)
+
+    def __add(self, key, obj):
+        """Puts obj in __objects and in the indexes"""
+        old = self.__objects.get(key)
+        if old is not None:
+            self.__unindex(key, old)
+        self.__objects[key] = obj
+        self.__by_class.setdefault(obj.__class__, {})[key] = obj
+        obj.track_changes(self.__dirty)
+        self.__index_foreign_keys(key, obj)
+
+    def __index_foreign_keys(self, key, obj):
+        """Files obj under the current values of its foreign keys"""
+        name = obj.__class__.__name__
+        columns = FileStorage.__foreign_keys.get(name)
+        if columns:
+            values = tuple(getattr(obj, column, None) for column in columns)
+            for column, value in zip(columns, values):
+                self.__fk_index.setdefault(
+                    (name, column), {}).setdefault(value, {})[key] = obj
+            self.__fk_values[key] = values
+
+    def __refile(self, name):
+        """Refiles the modified objects of the class called name whose
+        foreign keys no longer match their index entries
+        """
+        columns = FileStorage.__foreign_keys.get(name)
+        if not columns or not self.__dirty:
+            return
+        for obj in list(self.__dirty):
+            if obj.__class__.__name__ != name:
+                continue
+            key = name + '.' + obj.id
+            if self.__objects.get(key) is not obj:
+                continue
+            values = tuple(getattr(obj, column, None) for column in columns)
+            if values != self.__fk_values.get(key):
+                self.__unindex_foreign_keys(key, obj)
+                self.__index_foreign_keys(key, obj)
+
+    def __remove(self, key):
+        """Drops key from __objects and from the indexes"""
+        obj = self.__objects.pop(key, None)
+        self.__records_cache.pop(key, None)
+        if obj is not None:
+            self.__unindex(key, obj)
+
+    def __unindex(self, key, obj):
+        """Drops key from the indexes obj was filed under"""
+        self.__by_class[obj.__class__].pop(key, None)
+        self.__unindex_foreign_keys(key, obj)
+
+    def __unindex_foreign_keys(self, key, obj):
+        """Drops key from the foreign key indexes"""
+        values = self.__fk_values.pop(key, None)
+        if values is None:
+            return
+        name = obj.__class__.__name__
+        for column, value in zip(FileStorage.__foreign_keys[name], values):
+            index = self.__fk_index[(name, column)]
+            index[value].pop(key, None)
+            if not index[value]:
+                del index[value]
+
+    @synchronized
     def new(self, obj):
-        """Adds new object to storage dictionary"""
-        self.all().update({obj.to_dict()['__class__'] + '.' + obj.id: obj})
+        """Adds new object to storage dictionary
+
+        Adding an object that is already stored refreshes its index
+        entries, so attribute updates followed by save() are indexed.
+        """
+        self.__load_shards((obj.__class__.__name__,))
+        key = obj.__class__.__name__ + '.' + obj.id
+        self.__discard(key)
+        self.__add(key, obj)
+        self.__pending.add(key)
+
+    @synchronized
+    def new_many(self, objects):
+        """Adds many new objects to storage at once
+
+        Nothing is written until the next save() or bulk_save().
+
+        Arguments:
+            objects -- Iterable of model instances.
+        """
+        loaded = set()
+        for obj in objects:
+            name = obj.__class__.__name__
+            if name not in loaded:
+                self.__load_shards((name,))
+                loaded.add(name)
+            key = name + '.' + obj.id
+            self.__discard(key)
+            self.__add(key, obj)
+            self.__pending.add(key)
+
+    @synchronized
+    def unsaved(self):
+        """Returns the classes of the objects the next save() writes:
+        the objects added or deleted, and the ones modified in place
+        """
+        classes = self.classes()
+        unsaved = {classes[key.partition('.')[0]] for key in self.__pending}
+        unsaved.update(type(obj) for obj in tuple(self.__dirty))
+        return unsaved
+
+    def bulk_save(self):
+        """Writes the objects added by new_many(), with a single write
 
+        The file layouts already write everything at once, so this is
+        save().
+        """
+        self.save()
+
+    @synchronized
     def save(self):
-        """Saves storage dictionary to file"""
-        with open(FileStorage.__file_path, 'w') as f:
-            temp = {}
-            temp.update(FileStorage.__objects)
-            for key, val in temp.items():
-                temp[key] = val.to_dict()
-            json.dump(temp, f)
+        """Saves storage dictionary to file
 
-    def reload(self):
-        """Loads storage dictionary from file"""
+        Objects are only serialized again when they were modified since
+        they were last read or saved (BaseModel adds them to the dirty
+        set of the storage), the others are written from the record kept
+        from that time.
+        In journal mode only the objects added, modified or deleted since
+        the last save are appended to the journal. With the sharded layout
+        only the shards of those objects' classes are rewritten.
+        In write-behind mode the write happens later, in the background.
+        """
+        if self.__writer is not None:
+            self.__writer.notify()
+        else:
+            self.__commit()
+
+    def flush(self):
+        """Returns once the saves made so far are written to disk
+
+        Only needed in write-behind mode, where save() does not wait.
+        """
+        if self.__writer is not None:
+            self.__writer.flush()
+
+    @synchronized
+    def __commit(self):
+        """Writes the changes made since the last commit to disk
+
+        When another process committed since this one last read the
+        store, the objects it did not change here are taken from disk
+        instead of being overwritten with what this process read before.
+        """
+        self.__collect()
+
+        with self.__store_lock.exclusive() as version:
+            moved = version != self.__version
+            if self.__shard_dir is not None:
+                self.__save_shards()
+            elif self.__journal is not None:
+                # appends need no merge, the records of the others are
+                # replayed by the next close()
+                self.__append_journal()
+            else:
+                if moved:
+                    self.__merge_snapshot()
+                    moved = False
+                self.__snapshot_sig = self.__write(
+                    self.__file_path, self.__records(
+                        self.__raw.values(), self.__objects.items()))
+                self.__pending.clear()
+        if not moved:
+            self.__version = version + 1
+
+    def __collect(self):
+        """Moves the stored objects of the dirty set to __pending"""
+        dirty = self.__dirty
+        while dirty:
+            obj = dirty.pop()
+            key = obj.__class__.__name__ + '.' + obj.id
+            if self.__objects.get(key) is obj:
+                self.__pending.add(key)
+
+    def __append_journal(self):
+        """Appends the changes made since the last commit to the journal"""
+        pending, self.__pending = self.__pending, set()
+        ino, start, end = self.__journal.append(
+            (key, self.__journal_record(key)) for key in pending)
+        if (start == self.__journal_offset and
+                self.__journal_ino in (None, ino)):
+            # nobody else wrote in between, we are still up to date
+            self.__journal_ino = ino
+            self.__journal_offset = end
+
+    def __merge_snapshot(self):
+        """Takes the snapshot on disk as the base of the next write, or
+        of what is read again
+        """
+        self.__snapshot_sig, groups = self.__read(self.__file_path)
+        for name in set(self.classes()) | set(groups):
+            self.__merge(name, groups.get(name, {}))
+
+    def __merge(self, name, records):
+        """Replaces the objects of the class called name with the records
+        read from disk, except the ones changed and not committed yet
+
+        Objects missing from records were deleted by another process and
+        are dropped.
+        """
+        self.__collect()
+        cls = self.classes().get(name)
+        for key in list(self.__by_class.get(cls, {})):
+            if key not in self.__pending:
+                self.__remove(key)
+        if name in self.__raw:
+            self.__raw[name] = {}
+        for key in self.__pending:
+            if key.partition('.')[0] == name and key in records:
+                del records[key]
+        self.__stage({name: records})
+
+    def __records(self, raws, objects):
+        """Yields the (key, record) pairs to write, one at a time
+
+        Arguments:
+            raws -- Mappings of records never hydrated, written as is.
+            objects -- (key, obj) pairs of hydrated objects.
+        """
+        for raw in raws:
+            yield from raw.items()
+        cache = self.__records_cache
+        for key, val in objects:
+            record = cache.get(key)
+            if record is None or key in self.__pending:
+                record = cache[key] = self.__codec.record(val)
+                self.__clean(key, val)
+            yield key, record
+
+    def __journal_record(self, key):
+        """Returns the journal record of key, None if it was deleted"""
+        obj = self.__objects.get(key)
+        if obj is None:
+            return None
+        # journal lines are JSON, whatever the snapshot codec
+        self.__records_cache.pop(key, None)
+        record = obj.to_dict()
+        self.__clean(key, obj)
+        return record
+
+    def __clean(self, key, obj):
+        """Marks obj as saved, refiling it if a foreign key changed"""
+        if not obj.changes().isdisjoint(
+                FileStorage.__foreign_keys.get(obj.__class__.__name__, ())):
+            self.__unindex_foreign_keys(key, obj)
+            self.__index_foreign_keys(key, obj)
+        obj.clear_changes()
+
+    def __write(self, file_path, records):
+        """Writes the (key, record) pairs to file_path with the codec
+
+        Codecs able to stream get the records one at a time, so no copy
+        of the whole store is built in memory.
+
+        Returns:
+            The signature of the written file.
+        """
+        if hasattr(self.__codec, 'dump_iter'):
+            data = self.__codec.dump_iter(records)
+        else:
+            data = self.__codec.dumps(dict(records))
+        mode = 'wb' if self.__codec.binary else 'w'
+        return file_signature(write_atomic(file_path, data, mode))
+
+    def __read(self, file_path):
+        """Reads the records stored in file_path with the codec
+
+        Returns:
+            The signature of the read file and the records grouped by
+            class name, or (None, {}) if the file does not exist.
+        """
+        try:
+            if hasattr(self.__codec, 'open'):
+                stat, snapshot = self.__codec.open(file_path)
+                return file_signature(stat), snapshot.by_class()
+            groups = {}
+            with open(file_path, 'rb' if self.__codec.binary else 'r') as f:
+                sig = file_signature(os.fstat(f.fileno()))
+                if hasattr(self.__codec, 'load_iter'):
+                    records = self.__codec.load_iter(f)
+                else:
+                    records = self.__codec.loads(f.read()).items()
+                for key, record in records:
+                    groups.setdefault(key.partition('.')[0], {})[key] = record
+        except FileNotFoundError:
+            return None, {}
+        return sig, groups
+
+    def classes(self):
+        """Returns the model classes storage can rebuild, by name"""
         from models.base_model import BaseModel
         from models.user import User
         from models.place import Place
@@ -50,20 +698,142 @@ class FileStorage:
         from models.amenity import Amenity
         from models.review import Review
 
-        classes = {
+        return {
             'BaseModel': BaseModel, 'User': User, 'Place': Place,
             'State': State, 'City': City, 'Amenity': Amenity,
             'Review': Review
         }
-        try:
-            temp = {}
-            with open(FileStorage.__file_path, 'r') as f:
-                temp = json.load(f)
-                for key, val in temp.items():
-                    self.all()[key] = classes[val['__class__']](**val)
-        except FileNotFoundError:
-            pass
 
+    def __shard_path(self, name):
+        """Returns the file holding the objects of the class called name"""
+        return os.path.join(self.__shard_dir, name + self.__codec.suffix)
+
+    def __load_shards(self, names):
+        """Reads the shards of the given class names not read yet"""
+        if self.__shard_dir is None:
+            return
+        for name in names:
+            if name not in self.__shards:
+                self.__load_shard(name)
+
+    def __load_shard(self, name):
+        """Reads the shard of the class called name into __objects"""
+        with self.__store_lock.shared():
+            sig, groups = self.__read(self.__shard_path(name))
+        self.__merge(name, groups.get(name, {}))
+        self.__shards[name] = sig
+
+    def __save_shards(self):
+        """Rewrites the shards of the classes changed since the last save"""
+        names = {key.partition('.')[0] for key in self.__pending}
+        classes = self.classes()
+        os.makedirs(self.__shard_dir, exist_ok=True)
+        for name in names:
+            path = self.__shard_path(name)
+            if file_signature(stat_or_none(path)) != self.__shards.get(name):
+                # another process rewrote the shard since it was read
+                self.__merge(name, self.__read(path)[1].get(name, {}))
+            records = self.__records(
+                [self.__raw.get(name, {})],
+                self.__by_class.get(classes[name], {}).items())
+            self.__shards[name] = self.__write(
+                self.__shard_path(name), records)
+        self.__pending.clear()
+
+    def __stale_shards(self):
+        """Returns the names of the read shards that changed on disk"""
+        return [
+            name for name, sig in self.__shards.items()
+            if file_signature(stat_or_none(self.__shard_path(name))) != sig
+            ]
+
+    @synchronized
+    def reload(self):
+        """Loads storage dictionary from file
+
+        The records are only turned into model instances the first time
+        their class is accessed, so startup time and memory follow what
+        a process actually uses rather than the size of the store.
+        In journal mode the journal is replayed on top of the snapshot.
+        With the sharded layout the shards already read are read again,
+        the others the first time their class is accessed.
+        Objects deleted from the files since they were read are dropped,
+        the ones added, modified or deleted and not saved yet are kept.
+        """
+        with self.__store_lock.shared() as version:
+            self.__version = version
+            if self.__shard_dir is not None:
+                names, self.__shards = list(self.__shards), {}
+                self.__load_shards(names)
+                return
+
+            self.__merge_snapshot()
+
+            if self.__journal is not None:
+                self.__journal_ino = None
+                self.__journal_offset = 0
+                self.__replay()
+
+    def __replay(self):
+        """Applies the journal records past the last replayed offset,
+        except the ones of objects changed and not committed yet
+        """
+        journal_stat = stat_or_none(self.__journal.path)
+        if journal_stat is None:
+            return
+        changes, self.__journal_offset = self.__journal.replay(
+            self.__journal_offset)
+        self.__journal_ino = journal_stat.st_ino
+        self.__collect()
+        for key, val in changes:
+            if key in self.__pending:
+                continue
+            if val is None:
+                self.__discard(key)
+            else:
+                self.__stage({key.partition('.')[0]: {key: val}})
+
+    @synchronized
+    def changed(self):
+        """Tells whether the files changed since the last reload or save.
+
+        Returns:
+            None if nothing changed, 'journal' if only new journal records
+            were appended, 'shards' if some of the read shards changed, or
+            'snapshot' if a full reload is needed. The files are compared
+            even when the store version did not move, so files replaced
+            without taking the store lock are noticed too.
+        """
+        return self.__check()[1]
+
+    def __check(self):
+        """Returns the store version and what changed, see changed()"""
+        with self.__store_lock.shared() as version:
+            return version, self.__change()
+
+    def __change(self):
+        """Compares the files with what was last read or written"""
+        if self.__shard_dir is not None:
+            return 'shards' if self.__stale_shards() else None
+
+        snapshot_sig = file_signature(stat_or_none(self.__file_path))
+        if snapshot_sig != self.__snapshot_sig:
+            return 'snapshot'
+        if self.__journal is None:
+            return None
+        journal_stat = stat_or_none(self.__journal.path)
+        if journal_stat is None:
+            return None if self.__journal_ino is None else 'snapshot'
+        if self.__journal_ino is None:
+            return 'journal' if journal_stat.st_size else None
+        if (journal_stat.st_ino != self.__journal_ino or
+                journal_stat.st_size < self.__journal_offset):
+            return 'snapshot'
+        if journal_stat.st_size > self.__journal_offset:
+            return 'journal'
+        return None
+
+    @synchronized
     def delete(self, obj=None):
         """Delete obj from __objects if it's inside.
 
@@ -72,10 +842,91 @@ class FileStorage:
         """
 
         if obj is not None:
-            self.all().pop(obj.to_dict()['__class__'] + '.' + obj.id, None)
+            self.__load_shards((obj.__class__.__name__,))
+            key = obj.__class__.__name__ + '.' + obj.id
+            self.__discard(key)
+            self.__pending.add(key)
+
+    @synchronized
+    def delete_where(self, cls, filters=None):
+        """Deletes the objects of cls matching filters
+
+        The matches are found with query(), so id and foreign key filters
+        use the indexes. The objects referencing them through a foreign
+        key are deleted too, found through the foreign key indexes, as
+        the database engines would cascade. Nothing is written until the
+        next save().
+
+        Arguments:
+            cls -- Class of the objects to delete.
+
+        Keyword Arguments:
+            filters -- {column: value} pairs the objects have to be equal
+                to. All the objects of cls when empty. A column cls does
+                not have matches nothing. (default: {None})
+
+        Returns:
+            The number of objects of cls deleted.
+        """
+        matches = self.query(cls, filters)
+        self.__delete_cascade(cls.__name__, matches)
+        return len(matches)
+
+    def __delete_cascade(self, name, objects):
+        """Deletes the objects of class name and the ones referencing them
+
+        Arguments:
+            name -- Class name of the objects.
+            objects -- {key: obj} mapping of the objects to delete.
+        """
+        references = FileStorage.__references.get(name, ())
+        self.__access([child for child, column in references])
+        for child, column in references:
+            self.__refile(child)
+        for key, obj in objects.items():
+            for child, column in references:
+                children = self.__fk_index.get(
+                    (child, column), {}).get(obj.id, {})
+                self.__delete_cascade(child, {
+                    key: val for key, val in children.items()
+                    if getattr(val, column, None) == obj.id
+                    })
+            self.__discard(key)
+            self.__pending.add(key)
+
+    def compact(self):
+        """Folds the journal into the snapshot file (journal mode only)."""
+        self.flush()
+        if self.__journal is not None:
+            self.__journal.wait()
+            self.__journal.compact()
 
     def close(self):
         """
         Calls the reload method for deserializing the JSON file to objects.
+
+        The reload is skipped when the file did not change since it was
+        last read or written, and only the new journal records are
+        replayed when nothing else changed. With the sharded layout only
+        the changed shards are read again.
+        Saves still waiting in write-behind mode are written first.
         """
-        self.reload()
+        self.flush()
+        with self.__lock:
+            self.__refresh()
+
+    def __refresh(self):
+        """Reads again what changed on disk since the last read"""
+        version, change = self.__check()
+        self.__version = version
+        if change is None:
+            return
+        if self.__shard_dir is not None:
+            for name in self.__stale_shards():
+                self.__load_shard(name)
+            return
+
+        if change == 'snapshot':
+            self.reload()
+        elif change == 'journal':
+            self.__replay()
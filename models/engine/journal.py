@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+"""This module defines an append-only change journal for FileStorage.
+
+In journal mode every saved change is appended to a journal file as one
+compact JSON line instead of rewriting the whole snapshot. Once the
+journal grows past a size threshold it is folded back into the snapshot
+by a background compactor thread.
+
+Journal line format:
+    ["<ClassName>.<id>", {<to_dict() output>}]   -> object created/updated
+    ["<ClassName>.<id>", null]                   -> object deleted
+"""
+import json
+import os
+import threading
+from contextlib import nullcontext
+from models.engine.codecs import JSONCodec
+
+
+def write_atomic(file_path, data, mode='w'):
+    """Writes data to file_path through a temp file and an atomic rename.
+
+    Readers either see the previous content or the new one, never a
+    half-written file.
+
+    Arguments:
+        file_path -- Destination file.
+        data -- The str (or bytes when mode is 'wb') to write, or an
+            iterable of chunks written one at a time.
+        mode -- File mode used to open the temp file (default: {'w'})
+
+    Returns:
+        The os.stat_result of the written file.
+    """
+    tmp_path = '{}.{}.tmp'.format(file_path, os.getpid())
+    with open(tmp_path, mode) as f:
+        if isinstance(data, (str, bytes)):
+            f.write(data)
+        else:
+            f.writelines(data)
+        f.flush()
+        os.fsync(f.fileno())
+        stat = os.fstat(f.fileno())
+    os.replace(tmp_path, file_path)
+    return stat
+
+
+class Journal:
+    """Append-only journal sitting next to a FileStorage snapshot file."""
+
+    def __init__(self, snapshot_path, max_size=1024 * 1024, codec=None,
+                 lock=None):
+        """Creates a journal for the given snapshot.
+
+        Arguments:
+            snapshot_path -- The snapshot the journal is folded into.
+            max_size -- Journal size in bytes that triggers a background
+                compaction (default: {1 MiB})
+            codec -- Codec the snapshot is written with. Journal records
+                are always JSON lines. (default: {JSONCodec()})
+            lock -- StoreLock held exclusively while compacting, so other
+                processes do not append meanwhile. (default: {None})
+        """
+        self.snapshot_path = snapshot_path
+        self.codec = codec or JSONCodec()
+        self.path = snapshot_path + '.journal'
+        self.max_size = max_size
+        self.lock = lock
+        self.__lock = threading.Lock()
+        self.__compactor = None
+
+    def append(self, changes):
+        """Appends change records to the journal.
+
+        Arguments:
+            changes -- Iterable of (key, record) pairs, record being the
+                to_dict() output of the object or None for a deletion.
+
+        Returns:
+            The inode of the journal file and the (start, end) byte
+            offsets of the appended records.
+        """
+        lines = ''.join(
+            json.dumps([key, record], separators=(',', ':')) + '\n'
+            for key, record in changes
+            )
+        with self.__lock:
+            with open(self.path, 'a') as f:
+                f.write(lines)
+                end = f.tell()
+                ino = os.fstat(f.fileno()).st_ino
+        if end >= self.max_size:
+            self.compact_async()
+        return ino, end - len(lines), end
+
+    def replay(self, offset=0):
+        """Reads the change records stored in the journal.
+
+        Keyword Arguments:
+            offset -- Byte offset to start reading from (default: {0})
+
+        Returns:
+            A tuple of the list of (key, record) pairs and the offset
+            right after the last complete record.
+        """
+        changes = []
+        try:
+            with open(self.path, 'r') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith('\n'):
+                        # torn write from a crashed process, ignore it
+                        break
+                    changes.append(tuple(json.loads(line)))
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+        return changes, offset
+
+    def size(self):
+        """Returns the current journal size in bytes."""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def compact_async(self):
+        """Starts a background compaction unless one is running already."""
+        with self.__lock:
+            if self.__compactor is not None and self.__compactor.is_alive():
+                return
+            self.__compactor = threading.Thread(
+                target=self.compact, daemon=True)
+            self.__compactor.start()
+
+    def wait(self):
+        """Blocks until a running background compaction is finished."""
+        compactor = self.__compactor
+        if compactor is not None:
+            compactor.join()
+
+    def compact(self):
+        """Folds the journal into the snapshot file.
+
+        Only the part of the journal that exists when compaction starts
+        is folded; records appended meanwhile are carried over to the
+        fresh journal. Replaying a record twice is harmless, so a crash
+        between the snapshot rename and the journal swap loses nothing.
+        """
+        with (self.lock.exclusive(bump=False) if self.lock is not None
+              else nullcontext()):
+            self.__compact()
+
+    def __compact(self):
+        """Folds the journal into the snapshot file, see compact()."""
+        with self.__lock:
+            offset = self.size()
+        if offset == 0:
+            return
+
+        records = {}
+        try:
+            with open(self.snapshot_path,
+                      'rb' if self.codec.binary else 'r') as f:
+                records = self.codec.loads(f.read())
+        except FileNotFoundError:
+            pass
+
+        with open(self.path, 'r') as f:
+            chunk = f.read(offset)
+        for line in chunk.splitlines():
+            key, record = json.loads(line)
+            if record is None:
+                records.pop(key, None)
+            else:
+                records[key] = record
+
+        write_atomic(self.snapshot_path, self.codec.dumps(records),
+                     'wb' if self.codec.binary else 'w')
+
+        with self.__lock:
+            with open(self.path, 'r') as f:
+                f.seek(offset)
+                tail = f.read()
+            write_atomic(self.path, tail)
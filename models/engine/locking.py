@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""This module defines the lock file shared by the processes using one
+FileStorage store.
+
+The lock file sits next to the store ('<file_path>.lock') and is locked
+with fcntl.flock: shared by readers, exclusive for writers. It also
+holds the store version, a counter every commit increments, so a
+process can tell whether the store moved since it last read it without
+reading the store itself.
+"""
+import fcntl
+import os
+from contextlib import contextmanager
+
+
+class StoreLock:
+    """fcntl lock file holding the version of a store."""
+
+    def __init__(self, path):
+        """Creates the lock, the file itself is created by the first writer
+
+        Arguments:
+            path -- The lock file.
+        """
+        self.path = path
+
+    @contextmanager
+    def shared(self):
+        """Holds the lock shared with the other readers.
+
+        Yields:
+            The store version, 0 if nothing ever committed to it.
+        """
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+        except FileNotFoundError:
+            # no writer went through the lock yet
+            yield 0
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            yield self.__read(fd)
+        finally:
+            os.close(fd)
+
+    @contextmanager
+    def exclusive(self, bump=True):
+        """Holds the lock of a writer.
+
+        Keyword Arguments:
+            bump -- Store the next version when the block exits without
+                error. Writers that do not change the content of the
+                store, such as a journal compaction, leave it as is.
+                (default: {True})
+
+        Yields:
+            The store version before the write.
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            version = self.__read(fd)
+            yield version
+            if bump:
+                # fixed width, so no truncation is needed
+                os.pwrite(fd, b'%020d\n' % (version + 1), 0)
+        finally:
+            os.close(fd)
+
+    def version(self):
+        """Returns the current store version."""
+        with self.shared() as version:
+            return version
+
+    @staticmethod
+    def __read(fd):
+        """Returns the version stored in the lock file open as fd"""
+        data = os.pread(fd, 32, 0)
+        return int(data) if data.strip() else 0
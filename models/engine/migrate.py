@@ -0,0 +1,25 @@
+#!/usr/bin/python3
+"""Brings the schema of a database to the version of the models.
+
+Runs storage.upgrade() on the storage engine selected by
+HBNB_TYPE_STORAGE, like the console: missing tables and indexes are
+created and the schema version is stored. Prints the indexes it
+creates. Safe to run again.
+
+Usage: HBNB_TYPE_STORAGE=db python3 -m models.engine.migrate
+"""
+from models import storage
+
+
+def main():
+    """Migrates the database of the storage engine"""
+    if not hasattr(storage, 'upgrade'):
+        print('{} has no schema to migrate'.format(type(storage).__name__))
+        return
+    for name in storage.upgrade():
+        print('created index {}'.format(name))
+    print('schema version {}'.format(storage.schema_version()))
+
+
+if __name__ == '__main__':
+    main()
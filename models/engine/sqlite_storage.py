@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+"""This module defines a class to manage SQLite storage for hbnb clone"""
+from sqlalchemy import create_engine, event
+from models.engine.db_storage import DBStorage
+import os
+
+HBNB_SQLITE_PATH = os.getenv('HBNB_SQLITE_PATH')
+HBNB_SQLITE_REPLICAS = os.getenv('HBNB_SQLITE_REPLICAS')
+
+
+class SQLiteStorage(DBStorage):
+    """This class manages storage of hbnb models in a local SQLite file
+
+    It runs the same SQLAlchemy models and the same all/new/save/delete/
+    reload/close contract as DBStorage, without a database server.
+    """
+    __path = 'hbnb.db'
+    # applied to every new connection
+    __pragmas = (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('foreign_keys', 'ON'),
+        ('busy_timeout', 5000),
+        ('cache_size', -16000),
+        ('temp_store', 'MEMORY'),
+    )
+
+    def __init__(self, path=None, replicas=None, policy=None):
+        """Create the db engines
+
+        Keyword Arguments:
+            path -- The SQLite database file. Defaults to the
+                HBNB_SQLITE_PATH environment variable, then to 'hbnb.db'.
+                (default: {None})
+            replicas -- SQLite files read instead of path, see
+                DBStorage. Defaults to the comma separated files of the
+                HBNB_SQLITE_REPLICAS environment variable.
+                (default: {None})
+            policy -- How a session picks its replica, see DBStorage.
+                (default: {None})
+        """
+        self.__path = path or HBNB_SQLITE_PATH or SQLiteStorage.__path
+        if replicas is None:
+            replicas = [path for path in (HBNB_SQLITE_REPLICAS or '')
+                        .split(',') if path.strip()]
+        super().__init__(replicas, policy)
+
+    def create_engine(self):
+        """Returns the engine of the SQLite database
+
+        Connections come from a pool and are not tied to the thread that
+        opened them, so each thread gets its own connection for as long
+        as its session uses it. WAL mode lets those readers run while
+        another connection writes.
+        """
+        return self.create_replica_engine(self.__path)
+
+    def create_replica_engine(self, path):
+        """Returns the engine of the SQLite database file at path"""
+        engine = create_engine(
+            'sqlite:///' + path,
+            connect_args={'check_same_thread': False},
+            **self.pool_options())
+        event.listen(engine, 'connect', self.set_pragmas)
+        return engine
+
+    @staticmethod
+    def set_pragmas(dbapi_connection, connection_record):
+        """Tunes a new SQLite connection"""
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLiteStorage.__pragmas:
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+        cursor.close()
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+"""This module defines the group-commit writer used by FileStorage.
+
+In write-behind mode save() does not touch the disk, it only tells the
+writer that the store changed. A background thread then commits the
+store at most every `delay` seconds, or as soon as `max_pending` saves
+are waiting, so a burst of saves costs a single file rewrite.
+"""
+import atexit
+import threading
+import time
+
+
+class WriteBehind:
+    """Background thread coalescing bursts of saves into one commit."""
+
+    def __init__(self, commit, delay=0.05, max_pending=1000):
+        """Starts the writer thread.
+
+        Arguments:
+            commit -- Callable writing the store to disk.
+
+        Keyword Arguments:
+            delay -- Seconds a save may wait before it is written
+                (default: {0.05})
+            max_pending -- Number of waiting saves that triggers a commit
+                without waiting for the delay (default: {1000})
+        """
+        self.commit = commit
+        self.delay = delay
+        self.max_pending = max_pending
+        self.__cond = threading.Condition()
+        # held for the whole commit, so flush() also waits for a commit
+        # the thread already started
+        self.__commit_lock = threading.Lock()
+        self.__pending = 0
+        self.__since = None
+        self.__error = None
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        atexit.register(self.flush)
+
+    def notify(self):
+        """Records a save, committed later by the writer thread."""
+        with self.__cond:
+            if not self.__pending:
+                self.__since = time.monotonic()
+            self.__pending += 1
+            if self.__pending == 1 or self.__pending >= self.max_pending:
+                self.__cond.notify()
+
+    def pending(self):
+        """Returns the number of saves not written yet."""
+        with self.__cond:
+            return self.__pending
+
+    def flush(self):
+        """Commits the waiting saves and returns once they are on disk.
+
+        Raises the error of a failed background commit, if any.
+        """
+        with self.__commit_lock:
+            with self.__cond:
+                pending, self.__pending = self.__pending, 0
+                error, self.__error = self.__error, None
+            if pending:
+                self.commit()
+        if error is not None:
+            raise error
+
+    def __run(self):
+        """Writer thread loop."""
+        while True:
+            with self.__cond:
+                while not self.__pending:
+                    self.__cond.wait()
+                deadline = self.__since + self.delay
+                while 0 < self.__pending < self.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.__cond.wait(remaining)
+            with self.__commit_lock:
+                with self.__cond:
+                    pending, self.__pending = self.__pending, 0
+                if not pending:
+                    # flush() got there first
+                    continue
+                try:
+                    self.commit()
+                except Exception as error:
+                    # reported by the next flush()
+                    with self.__cond:
+                        self.__error = error
@@ -19,7 +19,8 @@ place_amenity = Table(
         String(60),
         ForeignKey('amenities.id'),
         nullable=False,
-        primary_key=True
+        primary_key=True,
+        index=True
         )
 )
 
@@ -27,8 +28,10 @@ place_amenity = Table(
 class Place(BaseModel, Base):
     """ A place to stay """
     __tablename__ = "places"
-    city_id = Column(String(60), ForeignKey("cities.id"), nullable=False)
-    user_id = Column(String(60), ForeignKey("users.id"), nullable=False)
+    city_id = Column(String(60), ForeignKey("cities.id"), nullable=False,
+                     index=True)
+    user_id = Column(String(60), ForeignKey("users.id"), nullable=False,
+                     index=True)
     name = Column(String(128), nullable=False)
     description = Column(String(1024), nullable=True)
     number_rooms = Column(Integer, nullable=False, default=0)
@@ -34,21 +34,21 @@ class State(BaseModel, Base):
         __tablename__ (str): The name of the table to use for this class.
         name (Column): The name of the state. It is a SQLAlchemy Column of
         type String with a maximum length of 128 characters, and it cannot
-        be null.
+        be null. It is indexed, the web pages sort states by name.
         cities (relationship): A SQLAlchemy relationship that represents all
         City instances associated with this State instance. When a State
         instance is deleted, all of its associated City instances are also
         deleted.
     """
     __tablename__ = 'states'
-    name = Column(String(128), nullable=False)
+    name = Column(String(128), nullable=False, index=True)
     cities = relationship(
         'City',
         cascade='all, delete',
         backref='state'
         )
 
-    if os.getenv("HBNB_TYPE_STORAGE") != 'db':
+    if os.getenv("HBNB_TYPE_STORAGE") not in ('db', 'sqlite'):
         @property
         def cities(self):
             """
@@ -64,9 +64,6 @@ class State(BaseModel, Base):
                 list: A list of City instances with the same state_id as the
                 current State instance.
             """
-            cities_to_curr_state = models.storage.all(models.City).values()
-            cities_to_curr_state = [
-                city for city in list(cities_to_curr_state)
-                if city.state_id == self.id
-            ]
-            return cities_to_curr_state
+            cities_to_curr_state = models.storage.lookup(
+                models.City, 'state_id', self.id)
+            return list(cities_to_curr_state.values())
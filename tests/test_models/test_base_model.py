@@ -25,10 +25,11 @@ class test_basemodel(unittest.TestCase):
 
     def tearDown(self):
         """the teardown method of the ctest class"""
-        try:
-            os.remove('file.json')
-        except Exception:
-            pass
+        for path in ('file.json', 'file.json.lock'):
+            try:
+                os.remove(path)
+            except Exception:
+                pass
 
     def test_init(self):
         """Tests the initialization of the model class.
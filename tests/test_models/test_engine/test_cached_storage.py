@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+''' module for cached_storage tests '''
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from models.city import City
+from models.engine.cached_storage import CachedStorage
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.place import Place
+from models.state import State
+from models.user import User
+
+
+class TestCachedStorage(unittest.TestCase):
+    '''testing the read cache on a file storage'''
+
+    def setUp(self):
+        '''Set up a cache over a storage holding one State'''
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.storage = CachedStorage(FileStorage(self.path), size=8)
+        self.state = State(name='Cairo')
+        self.storage.new(self.state)
+        self.storage.save()
+
+    def tearDown(self):
+        '''Remove the temporary directory'''
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_hits_and_misses(self):
+        '''the same read is answered from the cache'''
+        first = self.storage.all(State)
+        second = self.storage.all(State)
+        self.assertEqual(first, second)
+        self.assertEqual(self.storage.stats(),
+                         {'hits': 1, 'misses': 1, 'size': 1})
+        self.storage.count(State)
+        self.storage.count(State)
+        self.storage.get(State, self.state.id)
+        self.assertIs(self.storage.get(State, self.state.id), self.state)
+        self.assertEqual((self.storage.hits, self.storage.misses), (3, 3))
+
+    def test_results_are_copies(self):
+        '''changing a returned dictionary leaves the cache alone'''
+        self.storage.all(State).clear()
+        self.assertEqual(len(self.storage.all(State)), 1)
+
+    def test_new_invalidates_its_class(self):
+        '''new() invalidates the reads of its class only'''
+        self.storage.all(State)
+        self.storage.all(User)
+        self.storage.count()
+        other = State(name='Giza')
+        self.storage.new(other)
+        self.assertIn('State.' + other.id, self.storage.all(State))
+        self.assertEqual(self.storage.count(), 2)
+        self.storage.all(User)
+        self.assertEqual((self.storage.hits, self.storage.misses), (1, 5))
+
+    def test_save_invalidates(self):
+        '''an object modified then saved is read again'''
+        self.storage.query(State, filters={'name': 'Cairo'})
+        self.state.name = 'Alex'
+        # what BaseModel.save() does through models.storage
+        self.storage.new(self.state)
+        self.storage.save()
+        self.assertEqual(self.storage.query(State, filters={'name': 'Cairo'}),
+                         {})
+
+    def test_save_invalidates_modified(self):
+        '''an object modified in place is read again after save()'''
+        self.storage.query(State, filters={'name': 'Cairo'})
+        self.state.name = 'Alex'
+        self.storage.save()
+        self.assertEqual(self.storage.query(State, filters={'name': 'Cairo'}),
+                         {})
+
+    def test_delete_invalidates_cascade(self):
+        '''delete() invalidates the classes its rows cascade to'''
+        city = City(name='Giza', state_id=self.state.id)
+        self.storage.new(city)
+        self.storage.save()
+        self.assertEqual(len(self.storage.all(City)), 1)
+        self.storage.delete_where(State, {'id': self.state.id})
+        self.storage.save()
+        self.assertEqual(self.storage.all(City), {})
+        self.assertEqual(self.storage.count(State), 0)
+
+    def test_lru_eviction(self):
+        '''the least recently used entry goes first'''
+        storage = CachedStorage(FileStorage(self.path), size=2)
+        storage.count(State)
+        storage.count(User)
+        storage.count(State)
+        storage.count(City)
+        self.assertEqual(storage.stats()['size'], 2)
+        storage.count(State)
+        storage.count(User)
+        self.assertEqual((storage.hits, storage.misses), (2, 4))
+
+    def test_ttl(self):
+        '''entries are not served once their ttl ran out'''
+        storage = CachedStorage(FileStorage(self.path), ttl=10)
+        clock = 'models.engine.cached_storage.time.monotonic'
+        with mock.patch(clock, return_value=100):
+            storage.count(State)
+            storage.count(State)
+        with mock.patch(clock, return_value=111):
+            storage.count(State)
+        self.assertEqual((storage.hits, storage.misses), (1, 2))
+
+    def test_close_drops_changed_files(self):
+        '''close() drops the entries when another process wrote'''
+        self.assertEqual(self.storage.count(State), 1)
+        other = FileStorage(self.path)
+        other.reload()
+        other.new(State(name='Luxor'))
+        other.save()
+        self.assertEqual(self.storage.count(State), 1)
+        self.storage.close()
+        self.assertEqual(self.storage.count(State), 2)
+
+    def test_delegation(self):
+        '''other methods go to the wrapped storage'''
+        self.assertEqual([s.id for s in self.storage.iter(State)],
+                         [self.state.id])
+        self.assertEqual(self.storage.lookup(State, 'name', 'Cairo'),
+                         {'State.' + self.state.id: self.state})
+
+
+class TestCachedSQLiteStorage(unittest.TestCase):
+    '''testing the read cache on a database storage'''
+
+    def setUp(self):
+        '''Set up a cache over a temporary database'''
+        self.tmp = tempfile.mkdtemp()
+        self.storage = CachedStorage(
+            SQLiteStorage(os.path.join(self.tmp, 'hbnb.db')))
+
+    def tearDown(self):
+        '''Remove the temporary database'''
+        self.storage.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_loaded_relationships(self):
+        '''a new object invalidates the reads loading its class'''
+        state = State(name='Cairo')
+        city = City(name='Giza', state_id=state.id)
+        user = User(email='a@b.c', password='pwd')
+        for obj in (state, city, user):
+            self.storage.new(obj)
+            self.storage.save()
+        loaded = self.storage.get(City, city.id, load=['places'])
+        self.assertEqual(loaded.places, [])
+        self.storage.all(State)
+        self.storage.new(Place(name='Nile', city_id=city.id,
+                               user_id=user.id))
+        self.storage.save()
+        self.storage.close()
+        loaded = self.storage.get(City, city.id, load=['places'])
+        self.assertEqual([p.name for p in loaded.places], ['Nile'])
+        self.storage.all(State)
+        self.assertEqual((self.storage.hits, self.storage.misses), (1, 3))
+
+    def test_save_invalidates_modified(self):
+        '''a row modified in place is read again after save()'''
+        state = State(name='Cairo')
+        self.storage.new(state)
+        self.storage.save()
+        self.assertEqual(len(self.storage.query(State, {'name': 'Cairo'})), 1)
+        state.name = 'Alex'
+        self.storage.save()
+        self.assertEqual(self.storage.query(State, {'name': 'Cairo'}), {})
+        self.assertEqual(len(self.storage.query(State, {'name': 'Alex'})), 1)
@@ -3,7 +3,13 @@
 import unittest
 from models.base_model import BaseModel
 from models import storage
+from models.city import City
+from models.engine.file_storage import FileStorage
+from models.state import State
+import json
 import os
+import shutil
+import tempfile
 
 
 @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
@@ -13,18 +19,16 @@ class test_fileStorage(unittest.TestCase):
 
     def setUp(self):
         """ Set up test environment """
-        del_list = []
-        for key in storage._FileStorage__objects.keys():
-            del_list.append(key)
-        for key in del_list:
-            del storage._FileStorage__objects[key]
+        for obj in list(storage.all().values()):
+            storage.delete(obj)
 
     def tearDown(self):
         """ Remove storage file at end of tests """
-        try:
-            os.remove('file.json')
-        except Exception:
-            pass
+        for path in ('file.json', 'file.json.lock'):
+            try:
+                os.remove(path)
+            except Exception:
+                pass
 
     def test_obj_list_empty(self):
         """ __objects is initially empty """
@@ -107,7 +111,919 @@ class test_fileStorage(unittest.TestCase):
             temp = key
         self.assertEqual(temp, 'BaseModel' + '.' + _id)
 
+    def test_all_cls(self):
+        """ all(cls) only returns objects of that class """
+        state = State()
+        base = BaseModel()
+        storage.new(state)
+        storage.new(base)
+        self.assertEqual(storage.all(State), {'State.' + state.id: state})
+        self.assertEqual(
+            storage.all(BaseModel), {'BaseModel.' + base.id: base})
+        storage.delete(state)
+        self.assertEqual(storage.all(State), {})
+
+    def test_all_view(self):
+        """ all(cls, view=True) is a read-only live view """
+        view = storage.all(State, view=True)
+        state = State()
+        storage.new(state)
+        self.assertIn('State.' + state.id, view)
+        with self.assertRaises(TypeError):
+            view['State.x'] = state
+
+    def test_lookup(self):
+        """ lookup answers foreign key matches from the index """
+        state = State()
+        city = City(state_id=state.id, name='Cairo')
+        other = City(state_id='other', name='Giza')
+        storage.new(state)
+        storage.new(city)
+        storage.new(other)
+        self.assertEqual(
+            storage.lookup(City, 'state_id', state.id),
+            {'City.' + city.id: city})
+        self.assertEqual(state.cities, [city])
+        city.state_id = 'other'
+        storage.new(city)
+        self.assertEqual(state.cities, [])
+        self.assertEqual(len(storage.lookup(City, 'state_id', 'other')), 2)
+        storage.delete(other)
+        self.assertEqual(
+            storage.lookup(City, 'state_id', 'other'),
+            {'City.' + city.id: city})
+        self.assertEqual(
+            storage.lookup(City, 'name', 'Cairo'),
+            {'City.' + city.id: city})
+
     def test_storage_var_created(self):
         """ FileStorage object storage created """
-        from models.engine.file_storage import FileStorage
         self.assertEqual(type(storage), FileStorage)
+
+
+class TempStoreMixin:
+    """ Gives a test case a temporary directory to hold its stores """
+    # name of the store file in the temporary directory
+    file_name = 'file.json'
+
+    def setUp(self):
+        """ Set up a temporary directory """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, self.file_name)
+
+    def tearDown(self):
+        """ Remove the temporary directory """
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def make_storage(self, **options):
+        """ Returns a FileStorage of self.path built with options """
+        return FileStorage(self.path, **options)
+
+    def stored(self):
+        """ Returns the keys written to disk """
+        store = self.make_storage()
+        store.reload()
+        return set(store.all())
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageJournal(TempStoreMixin, unittest.TestCase):
+    """ Class to test the journal mode of the file storage """
+
+    def setUp(self):
+        """ Set up a journaled store in a temporary directory """
+        super().setUp()
+        self.store = self.make_storage(journal=True)
+
+    def test_save_appends(self):
+        """ save appends only the pending changes to the journal """
+        first = BaseModel()
+        self.store.new(first)
+        self.store.save()
+        size = os.path.getsize(self.path + '.journal')
+        second = BaseModel()
+        self.store.new(second)
+        self.store.save()
+        with open(self.path + '.journal') as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.assertGreater(os.path.getsize(self.path + '.journal'), size)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_reload_replays(self):
+        """ reload replays the journal on top of the snapshot """
+        kept = BaseModel()
+        gone = BaseModel()
+        self.store.new(kept)
+        self.store.new(gone)
+        self.store.save()
+        self.store.compact()
+        self.store.delete(gone)
+        kept.name = 'kept'
+        self.store.new(kept)
+        self.store.save()
+        other = self.make_storage(journal=True)
+        other.reload()
+        self.assertIn('BaseModel.' + kept.id, other.all())
+        self.assertNotIn('BaseModel.' + gone.id, other.all())
+        self.assertEqual(other.all()['BaseModel.' + kept.id].name, 'kept')
+
+    def test_replay_keeps_pending(self):
+        """ Replaying another store's records keeps unsaved changes """
+        state = State(name='Cairo')
+        self.store.new(state)
+        self.store.save()
+        other = self.make_storage(journal=True)
+        other.reload()
+        added = other.all(State)['State.' + state.id]
+        added.name = 'Giza'
+        other.new(added)
+        modified = State(name='Luxor')
+        other.new(modified)
+        other.save()
+        modified.name = 'Aswan'
+        state.name = 'Alex'
+        self.store.new(state)
+        self.store.close()
+        self.assertIs(self.store.all(State)['State.' + state.id], state)
+        self.store.reload()
+        self.assertIs(self.store.all(State)['State.' + state.id], state)
+        self.store.save()
+        other.close()
+        self.assertEqual(other.all(State)['State.' + state.id].name, 'Alex')
+        other.reload()
+        self.assertEqual(other.all(State)['State.' + state.id].name, 'Alex')
+        self.assertEqual(other.all(State)['State.' + modified.id].name,
+                         'Aswan')
+
+    def test_compact(self):
+        """ compact folds the journal into the snapshot """
+        new = BaseModel()
+        self.store.new(new)
+        self.store.save()
+        self.store.compact()
+        self.assertEqual(os.path.getsize(self.path + '.journal'), 0)
+        with open(self.path) as f:
+            self.assertIn('BaseModel.' + new.id, json.load(f))
+
+    def test_background_compaction(self):
+        """ Passing the size threshold compacts in the background """
+        from models.engine.journal import Journal
+        journal = Journal(self.path, max_size=1)
+        journal.append([('BaseModel.1', {'__class__': 'BaseModel'})])
+        journal.wait()
+        self.assertEqual(journal.size(), 0)
+        with open(self.path) as f:
+            self.assertIn('BaseModel.1', json.load(f))
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageClose(TempStoreMixin, unittest.TestCase):
+    """ Class to test the change detection done by close """
+
+    def setUp(self):
+        """ Set up two stores sharing one file """
+        super().setUp()
+        self.store = self.make_storage()
+        self.other = self.make_storage()
+
+    def test_close_unchanged(self):
+        """ close does not rebuild objects when the file is unchanged """
+        new = BaseModel()
+        self.store.new(new)
+        self.store.save()
+        self.assertIsNone(self.store.changed())
+        self.store.close()
+        self.assertIs(self.store.all()['BaseModel.' + new.id], new)
+
+    def test_close_changed(self):
+        """ close reloads objects written by another store """
+        self.store.reload()
+        new = BaseModel()
+        self.other.new(new)
+        self.other.save()
+        self.assertEqual(self.store.changed(), 'snapshot')
+        self.store.close()
+        self.assertIn('BaseModel.' + new.id, self.store.all())
+        self.assertIsNone(self.store.changed())
+
+    def test_close_journal_tail(self):
+        """ close only replays the journal records appended meanwhile """
+        store = self.make_storage(journal=True)
+        other = self.make_storage(journal=True)
+        first = BaseModel()
+        store.new(first)
+        store.save()
+        other.reload()
+        loaded = other.all()['BaseModel.' + first.id]
+        second = BaseModel()
+        store.new(second)
+        store.save()
+        self.assertEqual(other.changed(), 'journal')
+        other.close()
+        self.assertIn('BaseModel.' + second.id, other.all())
+        self.assertIs(other.all()['BaseModel.' + first.id], loaded)
+        self.assertIsNone(other.changed())
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageShards(TempStoreMixin, unittest.TestCase):
+    """ Class to test the sharded layout of the file storage """
+
+    def setUp(self):
+        """ Set up a sharded store in a temporary directory """
+        super().setUp()
+        self.store = self.make_storage(shards=True)
+
+    def test_save_dirty_shards(self):
+        """ save only rewrites the shards of changed classes """
+        self.store.new(State(name='Cairo'))
+        self.store.new(BaseModel())
+        self.store.save()
+        state_shard = os.path.join(self.path + '.d', 'State.json')
+        base_shard = os.path.join(self.path + '.d', 'BaseModel.json')
+        self.assertTrue(os.path.exists(state_shard))
+        os.utime(base_shard, ns=(0, 0))
+        self.store.new(State(name='Giza'))
+        self.store.save()
+        self.assertEqual(os.stat(base_shard).st_mtime_ns, 0)
+        with open(state_shard) as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    def test_lazy_shards(self):
+        """ A shard is only read when its class is accessed """
+        state = State(name='Cairo')
+        self.store.new(state)
+        self.store.new(BaseModel())
+        self.store.save()
+        with open(os.path.join(self.path + '.d', 'BaseModel.json'), 'w') as f:
+            f.write('not json')
+        other = self.make_storage(shards=True)
+        other.reload()
+        self.assertIn('State.' + state.id, other.all(State))
+        with self.assertRaises(ValueError):
+            other.all()
+
+    def test_close_stale_shards(self):
+        """ close only reads the shards changed on disk """
+        other = self.make_storage(shards=True)
+        self.assertEqual(other.all(State), {})
+        state = State(name='Cairo')
+        self.store.new(state)
+        self.store.save()
+        self.assertEqual(other.changed(), 'shards')
+        other.close()
+        self.assertIn('State.' + state.id, other.all(State))
+        self.assertIsNone(other.changed())
+
+    def test_journal_and_shards(self):
+        """ journal mode needs the single file layout """
+        with self.assertRaises(ValueError):
+            self.make_storage(journal=True, shards=True)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageCodecs(TempStoreMixin, unittest.TestCase):
+    """ Class to test the on-disk formats of the file storage """
+    file_name = 'file.hbnb'
+
+    def test_binary_round_trip(self):
+        """ The binary codec keeps every value type """
+        from datetime import datetime
+        from models.engine.codecs import BinaryCodec
+        codec = BinaryCodec()
+        records = {
+            'City.1': {
+                '__class__': 'City', 'id': '1', 'state_id': 's',
+                'created_at': datetime(2024, 4, 22, 20, 41, 7, 123),
+                'name': 'Caïro', 'rooms': 3, 'lat': 1.5, 'flag': True,
+                'none': None, 'tags': ['a', 2], 'extra': {'k': 'v'}
+                },
+            'City.2': {'__class__': 'City', 'id': '2', 'state_id': 's'},
+            }
+        data = codec.dumps(records)
+        self.assertEqual(codec.loads(data), records)
+        self.assertEqual(data.count(b'City'), 1)
+        with self.assertRaises(ValueError):
+            codec.loads(b'')
+
+    def test_binary_storage(self):
+        """ FileStorage saves and reloads with the binary codec """
+        store = self.make_storage(codec='binary')
+        state = State(name='Cairo')
+        store.new(state)
+        store.save()
+        other = self.make_storage(codec='binary')
+        other.reload()
+        loaded = other.all(State)['State.' + state.id]
+        self.assertEqual(loaded.name, 'Cairo')
+        self.assertEqual(loaded.created_at, state.created_at)
+
+    def test_convert(self):
+        """ convert rewrites a store from one codec to another """
+        from models.engine.codecs import convert
+        json_path = os.path.join(self.tmp, 'file.json')
+        store = FileStorage(json_path)
+        new = BaseModel()
+        store.new(new)
+        store.save()
+        self.assertEqual(convert(json_path, 'json', self.path, 'binary'), 1)
+        self.assertEqual(convert(self.path, 'binary', json_path, 'json'), 1)
+        other = FileStorage(json_path)
+        other.reload()
+        self.assertEqual(
+            other.all()['BaseModel.' + new.id].to_dict(), new.to_dict())
+
+    def test_json_streaming(self):
+        """ The JSON codec streams the same document as dumps/loads """
+        import io
+        from models.engine.codecs import JSONCodec
+        codec = JSONCodec()
+        records = {
+            'State.{}'.format(i): {
+                '__class__': 'State', 'id': str(i),
+                'name': 'n\u00e9 {}'.format(i), 'rooms': i,
+                'tags': ['a', {'b': None}], 'text': '} ,"'
+                } for i in range(50)
+            }
+        text = ''.join(codec.dump_iter(records.items()))
+        self.assertEqual(text, json.dumps(records))
+        for chunk_size in (1, 7, 4096):
+            loaded = dict(codec.load_iter(io.StringIO(text), chunk_size))
+            self.assertEqual(loaded, records)
+        self.assertEqual(
+            list(codec.load_iter(io.StringIO(' { } '), 1)), [])
+        for bad in ('', '{', '{"a": 1', '{"a" 1}', '{} x', '[]'):
+            with self.assertRaises(ValueError):
+                list(codec.load_iter(io.StringIO(bad), 2))
+
+    def test_unknown_codec(self):
+        """ Unknown codec names are rejected """
+        with self.assertRaises(ValueError):
+            self.make_storage(codec='yaml')
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageHydration(TempStoreMixin, unittest.TestCase):
+    """ Class to test the lazy hydration of reloaded records """
+
+    def setUp(self):
+        """ Set up a store holding a State and a BaseModel """
+        super().setUp()
+        store = self.make_storage()
+        self.state = State(name='Cairo')
+        self.base = BaseModel()
+        store.new(self.state)
+        store.new(self.base)
+        store.save()
+        self.store = self.make_storage()
+        self.store.reload()
+
+    def test_reload_is_lazy(self):
+        """ reload builds no model instance """
+        self.assertEqual(self.store._FileStorage__objects, {})
+
+    def test_all_cls_hydrates_cls(self):
+        """ all(cls) only builds the instances of cls """
+        states = self.store.all(State)
+        self.assertEqual(states['State.' + self.state.id].name, 'Cairo')
+        self.assertEqual(
+            list(self.store._FileStorage__objects),
+            ['State.' + self.state.id])
+        self.assertEqual(len(self.store.all()), 2)
+
+    def test_save_keeps_raw_records(self):
+        """ save writes the records that were never hydrated """
+        new = BaseModel()
+        self.store.new(new)
+        self.store.save()
+        other = self.make_storage()
+        other.reload()
+        self.assertEqual(len(other.all()), 3)
+        self.assertEqual(
+            other.all()['State.' + self.state.id].created_at,
+            self.state.created_at)
+
+    def test_delete_raw_record(self):
+        """ Deleting an object drops its pending record """
+        self.store.delete(self.base)
+        self.assertNotIn('BaseModel.' + self.base.id, self.store.all())
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageMapped(TempStoreMixin, unittest.TestCase):
+    """ Class to test the memory-mapped snapshots of the file storage """
+    file_name = 'file.hbnbm'
+
+    def test_snapshot_index(self):
+        """ A snapshot decodes single records through its index """
+        from datetime import datetime
+        from models.engine.codecs import MappedCodec, Snapshot
+        codec = MappedCodec()
+        records = {
+            'State.1': {'__class__': 'State', 'id': '1', 'name': 'Cairo',
+                        'created_at': datetime(2024, 1, 1)},
+            'City.2': {'__class__': 'City', 'id': '2', 'state_id': '1'},
+            'State.3': {'__class__': 'State', 'id': '3', 'name': 'Giza'},
+            }
+        data = codec.dumps(records)
+        snapshot = Snapshot(data)
+        self.assertEqual(snapshot['State.3'], records['State.3'])
+        self.assertEqual(codec.loads(data), records)
+        groups = snapshot.by_class()
+        self.assertEqual(sorted(groups['State']), ['State.1', 'State.3'])
+        self.assertEqual(dict(groups['City']), {'City.2': records['City.2']})
+        with self.assertRaises(ValueError):
+            Snapshot(b'HBNB')
+
+    def test_snapshot_records(self):
+        """ SnapshotRecords overrides and hides keys of the snapshot """
+        from models.engine.codecs import MappedCodec, Snapshot
+        data = MappedCodec().dumps(
+            {'State.1': {'__class__': 'State', 'id': '1'}})
+        records = Snapshot(data).by_class()['State']
+        records['State.2'] = {'__class__': 'State', 'id': '2'}
+        self.assertEqual(len(records), 2)
+        del records['State.1']
+        self.assertEqual(list(records), ['State.2'])
+        with self.assertRaises(KeyError):
+            records['State.1']
+
+    def test_mapped_storage(self):
+        """ FileStorage reads a mapped snapshot lazily """
+        from models.engine.codecs import SnapshotRecords
+        store = self.make_storage(codec='mapped')
+        state = State(name='Cairo')
+        store.new(state)
+        store.new(BaseModel())
+        store.save()
+        reader = self.make_storage(codec='mapped')
+        reader.reload()
+        self.assertIsInstance(
+            reader._FileStorage__raw['State'], SnapshotRecords)
+        self.assertEqual(
+            reader.all(State)['State.' + state.id].name, 'Cairo')
+        other = State(name='Giza')
+        store.new(other)
+        store.save()
+        self.assertEqual(len(reader.all()), 2)
+        reader.close()
+        self.assertEqual(len(reader.all(State)), 2)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageDirty(TempStoreMixin, unittest.TestCase):
+    """ Class to test that save only re-encodes modified objects """
+
+    def setUp(self):
+        """ Set up a reloaded store holding two States """
+        super().setUp()
+        store = self.make_storage()
+        self.a = State(name='Cairo')
+        self.b = State(name='Giza')
+        store.new(self.a)
+        store.new(self.b)
+        store.save()
+        self.store = self.make_storage()
+        self.store.reload()
+
+    def test_changes(self):
+        """ Assigning an attribute marks it as changed """
+        state = State(**self.a.to_dict())
+        self.assertEqual(state.changes(), frozenset())
+        state.name = 'Alex'
+        self.assertEqual(state.changes(), {'name'})
+        self.assertNotIn('_BaseModel__changed', state.to_dict())
+        state.clear_changes()
+        self.assertEqual(state.changes(), frozenset())
+
+    def test_save_clean_objects(self):
+        """ Clean objects are written from their cached record """
+        states = self.store.all(State)
+        codec = self.store._FileStorage__codec
+        encoded = []
+        record = codec.record
+
+        def spy(obj):
+            encoded.append(obj.id)
+            return record(obj)
+        codec.record = spy
+        states['State.' + self.a.id].name = 'Alex'
+        self.store.save()
+        self.assertEqual(encoded, [self.a.id])
+        self.store.save()
+        self.assertEqual(encoded, [self.a.id])
+
+    def test_direct_assignment_saved(self):
+        """ A plain attribute assignment is picked up by save """
+        self.store.all(State)['State.' + self.b.id].name = 'Luxor'
+        self.store.save()
+        other = self.make_storage()
+        other.reload()
+        self.assertEqual(other.all(State)['State.' + self.b.id].name, 'Luxor')
+        self.assertEqual(other.all(State)['State.' + self.a.id].name, 'Cairo')
+
+    def test_direct_assignment_journal(self):
+        """ In journal mode modified objects are appended on save """
+        store = self.make_storage(journal=True)
+        store.reload()
+        store.all(State)['State.' + self.a.id].name = 'Aswan'
+        store.save()
+        other = self.make_storage(journal=True)
+        other.reload()
+        self.assertEqual(other.all(State)['State.' + self.a.id].name, 'Aswan')
+
+    def test_dirty_set(self):
+        """ Only the modified objects reach the dirty set of the store """
+        states = self.store.all(State)
+        dirty = self.store._FileStorage__dirty
+        self.assertEqual(dirty, set())
+        states['State.' + self.a.id].name = 'Alex'
+        self.assertEqual(dirty, {states['State.' + self.a.id]})
+        self.store.save()
+        self.assertEqual(dirty, set())
+
+    def test_foreign_key_refiled(self):
+        """ Changing a foreign key moves the object in the index """
+        city = City(name='Nasr City', state_id=self.a.id)
+        self.store.new(city)
+        city.state_id = self.b.id
+        self.store.save()
+        self.assertEqual(self.store.lookup(City, 'state_id', self.a.id), {})
+        self.assertIn('City.' + city.id,
+                      self.store.lookup(City, 'state_id', self.b.id))
+
+    def test_foreign_key_refiled_unsaved(self):
+        """ An assigned foreign key is found before the next save """
+        city = City(name='Nasr City', state_id=self.a.id)
+        self.store.new(city)
+        self.store.save()
+        city.state_id = self.b.id
+        self.assertEqual(self.store.lookup(City, 'state_id', self.a.id), {})
+        self.assertEqual(list(self.store.lookup(City, 'state_id', self.b.id)),
+                         ['City.' + city.id])
+        self.assertEqual(
+            list(self.store.query(City, filters={'state_id': self.b.id})),
+            ['City.' + city.id])
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageWriteBehind(TempStoreMixin, unittest.TestCase):
+    """ Class to test the group-commit write-behind mode """
+
+    def test_save_is_deferred(self):
+        """ save does not write until flush """
+        store = self.make_storage(write_behind=60000)
+        obj = BaseModel()
+        store.new(obj)
+        store.save()
+        self.assertFalse(os.path.exists(self.path))
+        store.flush()
+        self.assertEqual(self.stored(), {'BaseModel.' + obj.id})
+
+    def test_close_flushes(self):
+        """ close writes the waiting saves """
+        store = self.make_storage(write_behind=60000)
+        obj = BaseModel()
+        store.new(obj)
+        store.save()
+        store.close()
+        self.assertEqual(self.stored(), {'BaseModel.' + obj.id})
+
+    def test_background_write(self):
+        """ The writer thread commits once the delay is over """
+        import time
+        store = self.make_storage(write_behind=10)
+        keys = set()
+        for _ in range(20):
+            obj = BaseModel()
+            store.new(obj)
+            store.save()
+            keys.add('BaseModel.' + obj.id)
+        for _ in range(200):
+            if os.path.exists(self.path) and self.stored() == keys:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.stored(), keys)
+
+    def test_saves_are_coalesced(self):
+        """ A burst of saves is written once """
+        store = self.make_storage(write_behind=60000)
+        writer = store._FileStorage__writer
+        commits = []
+        commit = writer.commit
+
+        def spy():
+            commits.append(1)
+            commit()
+        writer.commit = spy
+        for _ in range(50):
+            store.new(BaseModel())
+            store.save()
+        self.assertEqual(writer.pending(), 50)
+        store.flush()
+        store.flush()
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(len(self.stored()), 50)
+
+
+def _add_objects(path, count):
+    """ Saves count new objects to the store at path, one at a time """
+    store = FileStorage(path)
+    store.reload()
+    for _ in range(count):
+        store.new(BaseModel())
+        store.save()
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageLocking(TempStoreMixin, unittest.TestCase):
+    """ Class to test stores shared by several processes """
+
+    def setUp(self):
+        """ Set up two stores sharing one file """
+        super().setUp()
+        self.store = self.make_storage()
+        self.other = self.make_storage()
+
+    def test_version(self):
+        """ Every commit moves the store version """
+        from models.engine.locking import StoreLock
+        lock = StoreLock(self.path + '.lock')
+        self.assertEqual(lock.version(), 0)
+        self.store.save()
+        self.store.save()
+        self.assertEqual(lock.version(), 2)
+
+    def test_merge(self):
+        """ A commit keeps what another store committed meanwhile """
+        first = BaseModel()
+        self.store.new(first)
+        self.store.save()
+        self.other.reload()
+        second = BaseModel()
+        self.store.new(second)
+        self.store.save()
+        third = BaseModel()
+        self.other.new(third)
+        self.other.save()
+        self.assertEqual(self.stored(), {
+            'BaseModel.' + obj.id for obj in (first, second, third)})
+
+    def test_merge_delete(self):
+        """ A commit does not bring back what another store deleted """
+        first = BaseModel()
+        second = BaseModel()
+        self.store.new(first)
+        self.store.new(second)
+        self.store.save()
+        self.other.reload()
+        self.store.delete(first)
+        self.store.save()
+        second.name = 'updated'
+        self.other.new(second)
+        self.other.save()
+        self.assertEqual(self.stored(), {'BaseModel.' + second.id})
+
+    def test_merge_shards(self):
+        """ Shard commits merge with the other stores too """
+        store = self.make_storage(shards=True)
+        other = self.make_storage(shards=True)
+        first = BaseModel()
+        store.new(first)
+        other.new(BaseModel())
+        store.save()
+        other.save()
+        check = self.make_storage(shards=True)
+        self.assertEqual(len(check.all()), 2)
+
+    def test_refresh_drops_deleted(self):
+        """ close drops the objects another store deleted """
+        for options in ({}, {'shards': True}, {'journal': True}):
+            store = FileStorage(self.path + str(options), **options)
+            states = [State(name=name) for name in ('Y', 'Z')]
+            for state in states:
+                store.new(state)
+            store.save()
+            hydrated = FileStorage(self.path + str(options), **options)
+            hydrated.reload()
+            hydrated.all(State)
+            raw = FileStorage(self.path + str(options), **options)
+            raw.reload()
+            raw.count(State)
+            store.delete(states[1])
+            store.save()
+            # journal mode: the readers merge a new snapshot, not only
+            # replay the deletion
+            store.compact()
+            for other in (hydrated, raw):
+                other.close()
+                self.assertEqual(list(other.all(State)),
+                                 ['State.' + states[0].id], options)
+                self.assertEqual(other.count(State), 1, options)
+
+    def test_view_follows_refresh(self):
+        """ all() views follow the objects read again from disk """
+        for options in ({}, {'shards': True}, {'journal': True}):
+            path = self.path + str(options)
+            store = FileStorage(path, **options)
+            other = FileStorage(path, **options)
+            other.reload()
+            view = other.all(State, view=True)
+            store.new(State(name='Y'))
+            store.save()
+            other.close()
+            self.assertEqual(len(view), 1, options)
+            store.new(State(name='Z'))
+            store.save()
+            other.reload()
+            self.assertEqual(len(view), 2, options)
+            other.new(State(name='W'))
+            self.assertEqual(len(view), 3, options)
+
+    def test_unchanged_version(self):
+        """ Readers see no change until another store saves """
+        self.store.save()
+        self.other.reload()
+        self.assertIsNone(self.other.changed())
+        self.store.new(BaseModel())
+        self.store.save()
+        self.assertEqual(self.other.changed(), 'snapshot')
+
+    def test_unlocked_replace(self):
+        """ A file replaced without the store lock is read again """
+        self.store.new(BaseModel())
+        self.store.save()
+        self.other.reload()
+        self.assertEqual(self.other.count(), 1)
+        new = BaseModel()
+        with open(self.path, 'w') as f:
+            json.dump({'BaseModel.' + new.id: new.to_dict()}, f)
+        self.assertEqual(self.other.changed(), 'snapshot')
+        self.other.close()
+        self.assertEqual(list(self.other.all()), ['BaseModel.' + new.id])
+
+    def test_processes(self):
+        """ Concurrent writers in several processes lose no object """
+        import multiprocessing
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_add_objects, args=(self.path, 10))
+                   for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(len(self.stored()), 40)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageQuery(TempStoreMixin, unittest.TestCase):
+    """ Class to test the filtered query API """
+
+    def setUp(self):
+        """ Set up a reloaded store of States and Cities """
+        super().setUp()
+        store = self.make_storage()
+        self.states = [State(name=name) for name in ('Giza', 'Cairo', 'Aswan')]
+        self.city = City(name='Dokki', state_id=self.states[0].id)
+        for obj in self.states + [self.city]:
+            store.new(obj)
+        store.save()
+        self.store = self.make_storage()
+        self.store.reload()
+
+    def names(self, objects):
+        """ Returns the names of objects, in order """
+        return [obj.name for obj in objects.values()]
+
+    def test_query_id(self):
+        """ An id filter only builds the requested object """
+        state = self.states[1]
+        result = self.store.query(State, {'id': state.id})
+        self.assertEqual(list(result), ['State.' + state.id])
+        self.assertEqual(
+            list(self.store._FileStorage__objects), ['State.' + state.id])
+        self.assertEqual(self.store.query(State, {'id': 'missing'}), {})
+
+    def test_query_foreign_key(self):
+        """ Foreign key filters use the index """
+        result = self.store.query(City, {'state_id': self.states[0].id})
+        self.assertEqual(list(result), ['City.' + self.city.id])
+        self.assertEqual(
+            self.store.query(City, {'state_id': self.states[1].id}), {})
+
+    def test_query_filters(self):
+        """ Other filters scan the class """
+        result = self.store.query(State, {'name': 'Cairo'})
+        self.assertEqual(self.names(result), ['Cairo'])
+
+    def test_query_order(self):
+        """ Results are sorted by order_by """
+        self.assertEqual(
+            self.names(self.store.query(State, order_by='name')),
+            ['Aswan', 'Cairo', 'Giza'])
+        self.assertEqual(
+            self.names(self.store.query(State, order_by=['-name'])),
+            ['Giza', 'Cairo', 'Aswan'])
+
+    def test_query_paging(self):
+        """ limit and offset page through the sorted results """
+        self.assertEqual(
+            self.names(self.store.query(
+                State, order_by='name', limit=1, offset=1)),
+            ['Cairo'])
+        self.assertEqual(
+            self.names(self.store.query(State, order_by='name', offset=2)),
+            ['Giza'])
+
+    def test_get(self):
+        """ get returns one object without building the others """
+        state = self.states[2]
+        self.assertEqual(self.store.get(State, state.id).name, 'Aswan')
+        self.assertEqual(
+            list(self.store._FileStorage__objects), ['State.' + state.id])
+        self.assertIsNone(self.store.get(State, 'missing'))
+        self.assertIsNone(self.store.get(City, state.id))
+
+    def test_count(self):
+        """ count does not build any object """
+        self.assertEqual(self.store.count(State), 3)
+        self.assertEqual(self.store.count(City), 1)
+        self.assertEqual(self.store.count(), 4)
+        self.assertEqual(self.store._FileStorage__objects, {})
+        self.store.delete(self.store.get(State, self.states[0].id))
+        self.store.new(BaseModel())
+        self.assertEqual(self.store.count(State), 2)
+        self.assertEqual(self.store.count(), 4)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db',
+                 'fileStorage test not supported')
+class test_fileStorageBulk(TempStoreMixin, unittest.TestCase):
+    """ Class to test bulk ingestion """
+
+    def test_new_many(self):
+        """ new_many adds everything, bulk_save writes it once """
+        store = self.make_storage(shards=True)
+        objects = [State(name=str(i)) for i in range(50)] + [BaseModel()]
+        store.new_many(objects)
+        self.assertEqual(store.count(), 51)
+        self.assertFalse(os.path.exists(self.path + '.d'))
+        store.bulk_save()
+        other = self.make_storage(shards=True)
+        self.assertEqual(other.count(State), 50)
+        self.assertEqual(other.count(), 51)
+
+    def test_iter(self):
+        """ iter yields every object without keeping the new instances """
+        store = self.make_storage()
+        states = [State(name=str(i)) for i in range(7)]
+        store.new_many(states)
+        store.bulk_save()
+        store = self.make_storage()
+        store.reload()
+        hydrated = store.get(State, states[0].id)
+        objects = list(store.iter(State, batch_size=3))
+        self.assertEqual(sorted(obj.id for obj in objects),
+                         sorted(state.id for state in states))
+        self.assertIn(hydrated, objects)
+        self.assertEqual(len(store._FileStorage__objects), 1)
+
+    def test_delete_where(self):
+        """ delete_where cascades through the foreign key indexes """
+        from models.place import Place
+        from models.review import Review
+        from models.user import User
+        store = self.make_storage()
+        states = [State(name='Cairo'), State(name='Giza')]
+        user = User(email='a@b.c', password='pwd')
+        cities = [City(name=state.name, state_id=state.id)
+                  for state in states]
+        places = [Place(city_id=city.id, user_id=user.id, name=city.name)
+                  for city in cities]
+        reviews = [Review(place_id=place.id, user_id=user.id, text='ok')
+                   for place in places]
+        store.new_many(states + [user] + cities + places + reviews)
+        store.save()
+        self.assertEqual(store.delete_where(State, {'name': 'Cairo'}), 1)
+        self.assertEqual(
+            [store.count(cls) for cls in (State, City, Place, Review, User)],
+            [1, 1, 1, 1, 1])
+        self.assertIsNone(store.get(Review, reviews[0].id))
+        store.save()
+        other = self.make_storage()
+        other.reload()
+        self.assertEqual(other.count(), 5)
+        self.assertEqual(store.delete_where(City), 1)
+        self.assertEqual(store.count(Review), 0)
+        self.assertEqual(store.delete_where(State, {'nope': 'Giza'}), 0)
+        self.assertEqual(store.count(State), 1)
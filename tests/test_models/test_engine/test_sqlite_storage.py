@@ -0,0 +1,426 @@
+#!/usr/bin/python3
+''' module for sqlite_storage tests '''
+import os
+import shutil
+import tempfile
+import unittest
+from io import StringIO
+from unittest import mock
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from console import HBNBCommand
+from models.engine import db_storage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.state import State
+from models.user import User
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    '''testing the sqlite storage engine'''
+
+    def setUp(self):
+        '''Set up a storage on a temporary database'''
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'hbnb.db')
+        self.storage = SQLiteStorage(self.path)
+
+    def tearDown(self):
+        '''Remove the temporary database'''
+        self.storage.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_pragmas(self):
+        '''connections run in WAL mode with foreign keys enforced'''
+        engine = self.storage._DBStorage__engine
+        with engine.connect() as conn:
+            journal = conn.exec_driver_sql('PRAGMA journal_mode').scalar()
+            foreign = conn.exec_driver_sql('PRAGMA foreign_keys').scalar()
+        self.assertEqual(journal, 'wal')
+        self.assertEqual(foreign, 1)
+
+    def test_new_and_save(self):
+        '''saved objects are read back by another storage'''
+        state = State(name='Cairo')
+        self.storage.new(state)
+        self.storage.save()
+        other = SQLiteStorage(self.path)
+        states = other.all(State)
+        other.close()
+        self.assertEqual(list(states), ['State.' + state.id])
+        self.assertEqual(states['State.' + state.id].name, 'Cairo')
+
+    def test_all(self):
+        '''all returns every class, all(cls) only cls'''
+        state = State(name='Giza')
+        user = User(email='a@b.c', password='pwd')
+        self.storage.new(state)
+        self.storage.new(user)
+        self.storage.save()
+        self.assertEqual(set(self.storage.all()),
+                         {'State.' + state.id, 'User.' + user.id})
+        self.assertEqual(list(self.storage.all(User)), ['User.' + user.id])
+        self.assertEqual(set(self.storage.all([State, User])),
+                         {'State.' + state.id, 'User.' + user.id})
+
+    def test_close_and_reload(self):
+        '''objects stay available after close and reload'''
+        state = State(name='Luxor')
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.close()
+        self.storage.reload()
+        self.assertIn('State.' + state.id, self.storage.all(State))
+
+    def test_query(self):
+        '''query filters, sorts and pages in a single statement'''
+        states = [State(name=name) for name in ('Giza', 'Cairo', 'Aswan')]
+        for state in states:
+            self.storage.new(state)
+        self.storage.save()
+        statements = []
+        engine = self.storage._DBStorage__engine
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args: statements.append(args[2]))
+        result = self.storage.query(State, order_by='-name', limit=2)
+        self.assertEqual([state.name for state in result.values()],
+                         ['Giza', 'Cairo'])
+        self.assertEqual(len(statements), 1)
+        result = self.storage.query(State, {'id': states[2].id})
+        self.assertEqual(list(result), ['State.' + states[2].id])
+        self.assertEqual(
+            [state.name for state in self.storage.query(
+                State, {'name': 'Cairo'}).values()], ['Cairo'])
+
+    def test_get_and_count(self):
+        '''get is a primary key lookup, count a SELECT COUNT(*)'''
+        state = State(name='Minya')
+        user = User(email='a@b.c', password='pwd')
+        self.storage.new(state)
+        self.storage.new(user)
+        self.storage.save()
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertIsNone(self.storage.get(State, 'missing'))
+        statements = []
+        engine = self.storage._DBStorage__engine
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args: statements.append(args[2]))
+        self.assertEqual(self.storage.count(State), 1)
+        self.assertEqual(self.storage.count(), 2)
+        self.assertIn('count(', statements[0].lower())
+
+    def test_bulk_save(self):
+        '''new_many and bulk_save insert parents first, in batches'''
+        from models.city import City
+        from models.place import Place
+        state = State(name='Qena')
+        user = User(email='a@b.c', password='pwd')
+        cities = [City(name=str(i), state_id=state.id) for i in range(5)]
+        place = Place(city_id=cities[0].id, user_id=user.id, name='Nile')
+        self.storage.new_many(cities + [place, state, user])
+        self.storage.bulk_save(batch_size=2)
+        self.assertEqual(self.storage.count(City), 5)
+        self.assertEqual(self.storage.count(), 8)
+        self.storage.close()
+        self.assertEqual(self.storage.get(Place, place.id).number_rooms, 0)
+
+    def test_iter(self):
+        '''iter streams every object of the class'''
+        states = [State(name=str(i)) for i in range(7)]
+        self.storage.new_many(states)
+        self.storage.bulk_save()
+        objects = list(self.storage.iter(State, batch_size=3))
+        self.assertEqual(sorted(obj.id for obj in objects),
+                         sorted(state.id for state in states))
+
+    def test_load(self):
+        '''load fetches relationships with a fixed number of queries'''
+        from models.city import City
+        from models.place import Place
+        state = State(name='Sohag')
+        users = [User(email=str(i), password='pwd', first_name=str(i))
+                 for i in range(3)]
+        cities = [City(name=str(i), state_id=state.id) for i in range(3)]
+        places = [Place(city_id=city.id, user_id=user.id, name=city.name)
+                  for city, user in zip(cities, users)]
+        self.storage.new_many([state] + users + cities + places)
+        self.storage.bulk_save()
+        statements = []
+        engine = self.storage._DBStorage__engine
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args: statements.append(args[2]))
+
+        self.storage.close()
+        for place in self.storage.query(Place, load=['user']).values():
+            self.assertEqual(place.user.first_name, place.name)
+        self.assertEqual(len(statements), 1)
+
+        self.storage.close()
+        statements.clear()
+        objects = self.storage.all([City, User], load=['places.user'])
+        for city in self.storage.iter(City, load=['places']):
+            self.assertEqual(len(city.places), 1)
+        self.assertEqual(len(objects), 6)
+        self.assertEqual(len(statements), 6)
+
+    def test_delete(self):
+        '''delete removes exactly one row'''
+        states = [State(name='Cairo'), State(name='Giza')]
+        self.storage.new_many(states)
+        self.storage.bulk_save()
+        self.storage.delete(self.storage.get(State, states[0].id))
+        self.storage.save()
+        self.assertEqual(list(self.storage.all(State)),
+                         ['State.' + states[1].id])
+
+    def test_delete_where(self):
+        '''delete_where cascades with one DELETE per table'''
+        from models.amenity import Amenity
+        from models.city import City
+        from models.place import Place
+        from models.review import Review
+        states = [State(name='Cairo'), State(name='Giza')]
+        user = User(email='a@b.c', password='pwd')
+        cities = [City(name=str(i), state_id=states[i % 2].id)
+                  for i in range(10)]
+        places = [Place(city_id=city.id, user_id=user.id, name='p')
+                  for city in cities for _ in range(3)]
+        reviews = [Review(place_id=place.id, user_id=user.id, text='ok')
+                   for place in places]
+        amenity = Amenity(name='Wifi')
+        self.storage.new_many(
+            states + [user, amenity] + cities + places + reviews)
+        self.storage.bulk_save()
+        amenity = self.storage.get(Amenity, amenity.id)
+        for place in self.storage.all(Place).values():
+            place.amenities.append(amenity)
+        self.storage.save()
+        statements = []
+        engine = self.storage._DBStorage__engine
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args: statements.append(args[2]))
+        count = self.storage.delete_where(State, {'name': 'Cairo'})
+        self.storage.save()
+        self.assertEqual(count, 1)
+        self.assertLessEqual(len(statements), 6)
+        self.assertEqual(
+            [self.storage.count(cls) for cls in (State, City, Place, Review)],
+            [1, 5, 15, 15])
+        self.assertIsNone(self.storage.get(State, states[0].id))
+        self.assertEqual(self.storage.delete_where(State, {'nope': 'x'}), 0)
+        self.assertEqual(self.storage.count(State), 1)
+
+    def test_delete_unsaved(self):
+        '''deleting an object not saved yet, or never added, writes nothing'''
+        added = State(name='Cairo')
+        self.storage.new(added)
+        self.storage.delete(added)
+        self.storage.delete(State(name='Giza'))
+        self.storage.save()
+        self.assertEqual(self.storage.count(State), 0)
+
+    def test_thread_sessions(self):
+        '''each thread has its own session, close only ends the caller's'''
+        import threading
+        session = self.storage._DBStorage__session
+        mine = session()
+        theirs = []
+        thread = threading.Thread(target=lambda: theirs.append(session()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(mine, theirs[0])
+        self.assertIs(session(), mine)
+        self.storage.close()
+        self.assertIsNot(session(), mine)
+
+    def test_pool_options(self):
+        '''the pool is configured from the HBNB_DB_* settings'''
+        engine = self.storage._DBStorage__engine
+        self.assertEqual(engine.pool.size(), 5)
+        self.assertEqual(engine.pool._recycle, 3600)
+        self.assertFalse(engine.pool._pre_ping)
+        for value, expected in (('1', True), ('TRUE', True), ('yes', True),
+                                ('0', False), ('false', False), ('', False)):
+            with mock.patch.dict(os.environ,
+                                 {'HBNB_DB_POOL_PRE_PING': value}):
+                self.assertIs(db_storage._flag('HBNB_DB_POOL_PRE_PING'),
+                              expected, value)
+
+    def test_after_fork(self):
+        '''a forked child gets its own pool and session'''
+        state = State(name='Aswan')
+        self.storage.new(state)
+        self.storage.save()
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read)
+                count = self.storage.count(State)
+                os.write(write, str(count).encode())
+            finally:
+                os._exit(0)
+        os.close(write)
+        os.waitpid(pid, 0)
+        with os.fdopen(read) as f:
+            self.assertEqual(f.read(), '1')
+        self.assertEqual(self.storage.count(State), 1)
+
+    def replica(self, name, *states):
+        '''Returns the path of a replica database holding states'''
+        path = os.path.join(self.tmp, name)
+        replica = SQLiteStorage(path)
+        for state in states:
+            replica.new(State(name=state))
+        replica.save()
+        replica.close()
+        return path
+
+    def test_replica_reads(self):
+        '''reads go to the replica until the session writes'''
+        replica = self.replica('replica.db', 'Luxor')
+        storage = SQLiteStorage(self.path, replicas=[replica])
+        self.assertEqual([s.name for s in storage.all(State).values()],
+                         ['Luxor'])
+        state = State(name='Aswan')
+        storage.new(state)
+        storage.save()
+        self.assertEqual([s.name for s in storage.all(State).values()],
+                         ['Aswan'])
+        self.assertEqual(storage.count(State), 1)
+        storage.close()
+        self.assertIsNone(storage.get(State, state.id))
+        self.assertEqual(storage.count(State), 1)
+        self.assertEqual(
+            [s.name for s in storage.query(State).values()], ['Luxor'])
+        storage.delete_where(State)
+        storage.save()
+        storage.close()
+        self.assertEqual(self.storage.count(State), 0)
+        self.assertEqual(storage.count(State), 1)
+        storage.close()
+
+    def test_replica_round_robin(self):
+        '''sessions take turns on the replicas'''
+        replicas = [self.replica('one.db', 'One'),
+                    self.replica('two.db', 'Two')]
+        storage = SQLiteStorage(self.path, replicas=replicas)
+        names = []
+        for _ in range(4):
+            names.extend(s.name for s in storage.all(State).values())
+            storage.close()
+        self.assertEqual(names, ['One', 'Two', 'One', 'Two'])
+
+    def test_replica_least_busy(self):
+        '''a session picks the replica with the fewest connections'''
+        replicas = [self.replica('one.db', 'One'),
+                    self.replica('two.db', 'Two')]
+        storage = SQLiteStorage(self.path, replicas=replicas,
+                                policy='least-busy')
+        busy = storage._DBStorage__replicas[0].connect()
+        try:
+            for _ in range(2):
+                self.assertEqual(
+                    [s.name for s in storage.all(State).values()], ['Two'])
+                storage.close()
+        finally:
+            busy.close()
+        with self.assertRaises(ValueError):
+            SQLiteStorage(self.path, policy='random')
+
+    def test_migrate(self):
+        '''migrate adds the indexes missing from existing tables'''
+        engine = self.storage._DBStorage__engine
+        self.assertEqual(self.storage.migrate(), [])
+        with engine.begin() as conn:
+            conn.exec_driver_sql('DROP INDEX ix_cities_state_id')
+            conn.exec_driver_sql('DROP INDEX ix_users_email')
+        self.assertEqual(self.storage.migrate(),
+                         ['ix_users_email', 'ix_cities_state_id'])
+        with engine.connect() as conn:
+            plan = ' '.join(row[-1] for row in conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT * FROM cities "
+                "WHERE state_id = 'x'"))
+        self.assertIn('ix_cities_state_id', plan)
+        self.assertEqual(self.storage.migrate(), [])
+
+    def test_startup_schema_check(self):
+        '''a current schema costs startup a single SELECT'''
+        self.assertEqual(self.storage.schema_version(),
+                         db_storage.SCHEMA_VERSION)
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(Engine, 'before_cursor_execute', record)
+        try:
+            SQLiteStorage(self.path).close()
+        finally:
+            event.remove(Engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 1)
+        self.assertIn('hbnb_schema', statements[0])
+
+    def test_upgrade(self):
+        '''a database without a stored version is upgraded at startup'''
+        state = State(name='Qena')
+        self.storage.new(state)
+        self.storage.save()
+        with self.storage._DBStorage__engine.begin() as conn:
+            conn.exec_driver_sql('DROP TABLE hbnb_schema')
+            conn.exec_driver_sql('DROP INDEX ix_states_name')
+        self.assertEqual(self.storage.schema_version(), 0)
+        other = SQLiteStorage(self.path)
+        self.assertEqual(other.schema_version(), db_storage.SCHEMA_VERSION)
+        self.assertEqual(other.migrate(), [])
+        self.assertEqual(other.get(State, state.id).name, 'Qena')
+        self.assertEqual(other.upgrade(), [])
+        other.close()
+
+    def test_truncate(self):
+        '''the test environment empties the tables instead of dropping'''
+        self.storage.new(State(name='Sohag'))
+        self.storage.new(User(email='a@b.c', password='pwd'))
+        self.storage.save()
+        self.storage.close()
+        with mock.patch.object(db_storage, 'HBNB_ENV', 'test'), \
+                mock.patch.object(db_storage.Base.metadata,
+                                  'drop_all') as drop_all:
+            other = SQLiteStorage(self.path)
+        drop_all.assert_not_called()
+        self.assertEqual(other.count(), 0)
+        self.assertEqual(other.schema_version(), db_storage.SCHEMA_VERSION)
+        other.close()
+
+
+class TestSQLiteConsole(unittest.TestCase):
+    '''testing the console on the sqlite storage engine'''
+
+    def setUp(self):
+        '''Set up the console on a temporary database'''
+        self.tmp = tempfile.mkdtemp()
+        self.storage = SQLiteStorage(os.path.join(self.tmp, 'hbnb.db'))
+        patcher = mock.patch('console.storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        '''Remove the temporary database'''
+        self.storage.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def run_command(self, line):
+        '''Returns what the console prints for line'''
+        with mock.patch('sys.stdout', new=StringIO()) as cout:
+            cons = HBNBCommand()
+            cons.onecmd(cons.precmd(line))
+        return cout.getvalue().strip()
+
+    def test_base_model(self):
+        '''BaseModel has no table, it never has instances'''
+        missing = '** no instance found **'
+        self.assertEqual(self.run_command('show BaseModel 123'), missing)
+        self.assertEqual(self.run_command('destroy BaseModel 1'), missing)
+        self.assertEqual(self.run_command('update BaseModel 1 a b'),
+                         missing)
+        self.assertEqual(self.run_command('count BaseModel'), '0')
+        self.assertEqual(self.run_command('BaseModel.count()'), '0')
+        self.assertEqual(self.run_command('all BaseModel'), '[]')
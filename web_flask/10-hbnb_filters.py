@@ -63,8 +63,10 @@ def hbnb_filters():
         and a variable number of keyword arguments, and returns a string with
         placeholders in the template file replaced with the appropriate values.
     """
-    state_objects = list(models.storage.all(models.State).values())
-    amenity_objects = list(models.storage.all(models.Amenity).values())
+    state_objects = list(models.storage.query(
+        models.State, load=['cities']).values())
+    amenity_objects = list(models.storage.query(
+        models.Amenity).values())
 
     states = [
         {
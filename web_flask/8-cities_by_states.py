@@ -64,7 +64,7 @@ def cities_by_states():
         and a variable number of keyword arguments, and returns a string with
         placeholders in the template file replaced with the appropriate values.
     """
-    states = list(models.storage.all(models.State).values())
+    states = list(models.storage.query(models.State, load=['cities']).values())
     all = [
         {
             'id': state.id,
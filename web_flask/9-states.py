@@ -70,7 +70,7 @@ def cities(id):
     """
     data = {'states': None, 'state': None}
     if id is not None:
-        state = models.storage.all(models.State).get(f'State.{id}')
+        state = models.storage.get(models.State, id, load=['cities'])
         if state is not None:
             state = {
                 'id': state.id,
@@ -84,7 +84,7 @@ def cities(id):
                 }
             data.update({'state': state})
     else:
-        states = list(models.storage.all(models.State).values())
+        states = list(models.storage.query(models.State).values())
         states = [
             {
                 'id': state.id,